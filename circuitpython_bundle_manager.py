@@ -22,12 +22,18 @@ import logging
 from shutil import rmtree
 
 from constants import *
+from helpers.github_api import RequestScheduler, ResponseCache
 from helpers.singleton import Singleton
+from managers.asset_cache_manager import AssetCacheManager
 from managers.bundle_manager import BundleManager, Bundle
+from managers.catalog_manager import CatalogManager
 from managers.credential_manager import CredentialManager
 from managers.data_manager import DataManager
 from managers.device_manager import DeviceManager
 from managers.device_manager import Drive
+from managers.object_manager import ObjectManager
+from managers.staging_manager import StagingManager
+from managers.watch_manager import WatchManager
 
 
 class CircuitPythonBundleManager(metaclass=Singleton):
@@ -37,10 +43,28 @@ class CircuitPythonBundleManager(metaclass=Singleton):
         self._selected_drive = None
         self.on_new_selected_drive = lambda: None
         self.cred_manager = CredentialManager(SERVICE_NAME, GITHUB_TOKEN_NAME)
-        self.bundle_manager = BundleManager(BUNDLES_PATH)
+        self.catalog_manager = CatalogManager(CATALOG_PATH)
+        self.staging_manager = StagingManager(BUNDLES_PATH)
+        self.staging_manager.clean()
+        self.bundle_manager = BundleManager(BUNDLES_PATH, INDEX_PATH,
+                                            INDEX_WORKERS,
+                                            self.catalog_manager)
+        self.watch_manager = WatchManager(self.bundle_manager)
+        self.object_manager = ObjectManager(BUNDLES_PATH)
+        self.asset_cache_manager = AssetCacheManager(BUNDLES_PATH,
+                                                     ASSET_CACHE_SIZE)
+        self.api_cache = ResponseCache(API_CACHE_PATH)
+        self.api_scheduler = RequestScheduler()
         self.device_manager = DeviceManager(DRIVE_PATH)
         self.data_manager = DataManager(settings_path)
 
+    def close(self):
+        """
+        Write everything that is only kept in memory to the disk. Call this
+        before exiting.
+        """
+        self.api_cache.save_to_disk()
+
     def delete_bundle(self, bundle: Bundle):
         """
         Delete a bundle.
@@ -51,6 +75,8 @@ class CircuitPythonBundleManager(metaclass=Singleton):
         path = bundle.path
         logging.debug(f"Path is {path}")
         rmtree(path)
+        self.bundle_manager.remove_bundle(path)
+        self.object_manager.collect_garbage()
 
     @property
     def selected_bundle(self) -> Bundle:
@@ -18,6 +18,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
 from pathlib import Path
 from helpers.operating_system import on_linux, on_macos
 
@@ -29,6 +30,15 @@ elif on_macos():
 else:
     DRIVE_PATH = None
 SETTINGS_PATH = Path.cwd() / "settings.json"
+INDEX_PATH = Path.cwd() / "index.json"
+INDEX_WORKERS = 8
+CATALOG_PATH = Path.cwd() / "catalog.db"
+API_CACHE_PATH = Path.cwd() / "api_cache.json"
+USE_GRAPHQL = False
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_RETRIES = 3
+ASSET_CACHE_SIZE = 512 * 1024 * 1024
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
 ICON_PATH = Path.cwd() / "icon.png"
 LICENSE_PATH = Path.cwd() / "LICENSE"
 
@@ -0,0 +1,821 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import logging
+import re
+from datetime import datetime
+from json import dumps, loads
+from pathlib import Path
+from threading import Condition, Event, Lock, Thread
+from time import time
+from typing import Any, Iterable, Mapping, Union
+
+import requests
+from github.GithubException import BadCredentialsException, \
+    GithubException, RateLimitExceededException, UnknownObjectException
+
+from helpers.create_logger import create_logger
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+API_URL = "https://api.github.com"
+RELEASES_PER_PAGE = 30
+# Seconds to wait for the API to respond
+API_TIMEOUT = 30
+
+# Seconds to use a GraphQL response without asking again, as GraphQL
+# responses have no ETag to revalidate with
+GRAPHQL_MAX_AGE = 60
+# The most assets fetched with each release in a GraphQL query
+GRAPHQL_ASSETS = 100
+RELEASES_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    releases(first: $first, after: $after,
+             orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId tagName name url publishedAt
+        releaseAssets(first: %d) {
+          nodes { databaseId name size downloadUrl }
+        }
+      }
+    }
+  }
+}
+""" % GRAPHQL_ASSETS
+
+# The most responses kept in a ResponseCache, the least recently used ones
+# are dropped past this
+MAX_CACHED_RESPONSES = 256
+# Responses that expired this many seconds ago are dropped, as their ETag is
+# unlikely to still match
+CACHED_RESPONSE_MAX_AGE = 7 * 24 * 60 * 60
+# The least time between writes of a ResponseCache to the disk in seconds,
+# changes in between are written by the next write or save_to_disk()
+CACHE_SAVE_INTERVAL = 30
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+NEXT_PAGE_PATTERN = re.compile(r"rel=\"next\"")
+
+# Requests the user is waiting on go before prefetches
+USER_PRIORITY = 0
+PREFETCH_PRIORITY = 1
+# Prefetches stop when less than this much of the rate limit is left, so it
+# is never used up by requests the user didn't ask for
+PREFETCH_RESERVE = 0.1
+# Prefetches are spread out over the rest of the rate limit window when less
+# than this much of the rate limit is left
+BACKOFF_THRESHOLD = 0.25
+# The longest a prefetch waits before being sent, in seconds
+MAX_BACKOFF = 10
+
+
+def cache_key(url: str, headers: Mapping[str, str]) -> str:
+    """
+    Get the key a response is cached under. Responses depend on who asked
+    (like private repos and rate limits), so the key includes a hash of the
+    Authorization header and a response is never used for another token.
+
+    :param url: The URL that was requested.
+    :param headers: The headers of the request.
+    :return: A string.
+    """
+    auth = hashlib.sha256(headers.get("Authorization", "").encode())
+    return f"{url} {auth.hexdigest()[:16]}"
+
+
+class ResponseCache:
+    def __init__(self, cache_path: Union[Path, None] = None,
+                 max_responses: int = MAX_CACHED_RESPONSES):
+        """
+        Make a ResponseCache, which keeps GitHub API responses on the disk with
+        their ETag so they can be revalidated with If-None-Match. Changes are
+        written to the disk at most every CACHE_SAVE_INTERVAL seconds, call
+        save_to_disk() to write them right away.
+
+        :param cache_path: The path to the JSON file to keep responses in, or
+         None to only keep them in memory.
+        :param max_responses: The most responses to keep.
+        """
+        self.path = cache_path
+        self.max_responses = max_responses
+        self.lock = Lock()
+        self.responses = {}
+        self.dirty = False
+        self.saved_at = 0
+        self.load_from_disk()
+
+    def load_from_disk(self):
+        """
+        Load the cached responses from the disk.
+        """
+        if self.path is None:
+            return
+        logger.debug(f"Loading API response cache from {self.path}")
+        with self.lock:
+            try:
+                self.responses = loads(self.path.read_text())
+            except (FileNotFoundError, ValueError):
+                self.responses = {}
+            self.dirty = False
+            self.evict()
+
+    def save_to_disk(self):
+        """
+        Save the cached responses to the disk if anything has changed.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            self.write()
+
+    def write(self):
+        """
+        Write the cached responses to the disk. Must be called with the lock
+        held.
+        """
+        logger.debug(f"Saving API response cache to {self.path}")
+        self.path.write_text(dumps(self.responses))
+        self.dirty = False
+        self.saved_at = time()
+
+    def changed(self):
+        """
+        Note that the responses changed, and save them if they haven't been
+        saved in a while. Must be called with the lock held.
+        """
+        self.dirty = True
+        self.evict()
+        if self.path is not None and \
+                time() - self.saved_at >= CACHE_SAVE_INTERVAL:
+            self.write()
+
+    def evict(self):
+        """
+        Drop responses that expired long ago, then the least recently used
+        responses until there are at most self.max_responses. Must be called
+        with the lock held.
+        """
+        oldest = time() - CACHED_RESPONSE_MAX_AGE
+        for key in [key for key, response in self.responses.items()
+                    if response["expires"] < oldest]:
+            del self.responses[key]
+            self.dirty = True
+        extra = len(self.responses) - self.max_responses
+        if extra > 0:
+            by_use = sorted(self.responses.items(),
+                            key=lambda item: item[1].get("used", 0))
+            for key, _ in by_use[:extra]:
+                del self.responses[key]
+            self.dirty = True
+
+    def get(self, key: str) -> Union[dict, None]:
+        """
+        Get a cached response.
+
+        :param key: The key of the request. (See cache_key)
+        :return: A dictionary with the "etag", "link", "expires" and "body"
+         keys, or None if the request isn't cached.
+        """
+        with self.lock:
+            response = self.responses.get(key)
+            if response is not None:
+                response["used"] = time()
+            return response
+
+    def put(self, key: str, etag: Union[str, None], link: Union[str, None],
+            max_age: int, body: Any):
+        """
+        Cache a response.
+
+        :param key: The key of the request. (See cache_key)
+        :param etag: The ETag of the response, or None.
+        :param link: The Link header of the response, or None.
+        :param max_age: How many seconds the response can be used without
+         asking GitHub again.
+        :param body: The decoded JSON body.
+        """
+        with self.lock:
+            self.responses[key] = {
+                "etag": etag, "link": link, "expires": time() + max_age,
+                "used": time(), "body": body
+            }
+            self.changed()
+
+    def refresh(self, key: str, max_age: int):
+        """
+        Mark a cached response as fresh again, after GitHub said it didn't
+        change.
+
+        :param key: The key of the request. (See cache_key)
+        :param max_age: How many seconds the response can be used without
+         asking GitHub again.
+        """
+        with self.lock:
+            if key not in self.responses:
+                return
+            self.responses[key]["expires"] = time() + max_age
+            self.changed()
+
+
+class RequestScheduler:
+    def __init__(self):
+        """
+        Make a RequestScheduler, which keeps track of the GitHub API rate
+        limit from the X-RateLimit-* headers of every response and decides
+        when requests can be sent. Requests the user is waiting on always go
+        first: prefetches wait for them, slow down as the rate limit gets
+        close, and are refused once only a reserve is left.
+        """
+        self.condition = Condition()
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.user_requests = 0
+
+    def quota(self) -> tuple[Union[int, None], Union[int, None],
+                             Union[float, None]]:
+        """
+        Get what is known about the rate limit.
+
+        :return: A tuple of how many requests are left, how many requests are
+         allowed per window and when the window resets as a timestamp. Each
+         item is None until a response from GitHub has been seen.
+        """
+        with self.condition:
+            self.roll_over()
+            return self.remaining, self.limit, self.reset
+
+    def roll_over(self):
+        """
+        Assume the whole rate limit is available again if the window has
+        reset. Must be called with the condition held.
+        """
+        if self.reset is not None and self.reset <= time() and \
+                self.limit is not None:
+            self.remaining = self.limit
+            self.reset = None
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Update the rate limit from the headers of a response.
+
+        :param headers: The response headers.
+        """
+        try:
+            limit = int(headers["X-RateLimit-Limit"])
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        with self.condition:
+            self.limit = limit
+            self.remaining = remaining
+            self.reset = reset
+            self.condition.notify_all()
+        logger.debug(f"{remaining} / {limit} API requests left")
+
+    def backoff(self) -> float:
+        """
+        Get how long a prefetch should wait before being sent. Must be called
+        with the condition held.
+
+        :return: Seconds.
+        """
+        if self.limit is None or self.reset is None or \
+                self.remaining >= self.limit * BACKOFF_THRESHOLD:
+            return 0
+        window = max(self.reset - time(), 0)
+        return min(window / max(self.remaining, 1), MAX_BACKOFF)
+
+    def acquire(self, priority: int = USER_PRIORITY):
+        """
+        Wait until a request can be sent, then count it against the rate
+        limit. Every call must be followed by a call to release() with the
+        same priority. Raises RateLimitExceededException if the request
+        can't be sent before the rate limit resets.
+
+        :param priority: USER_PRIORITY or PREFETCH_PRIORITY.
+        """
+        with self.condition:
+            self.roll_over()
+            if priority == USER_PRIORITY:
+                if self.remaining == 0:
+                    raise RateLimitExceededException(
+                        403, {"message": f"API rate limit exceeded, resets "
+                                         f"at {self.reset_text()}"}, None
+                    )
+                self.user_requests += 1
+            else:
+                deadline = None
+                while True:
+                    self.roll_over()
+                    if self.user_requests > 0:
+                        self.condition.wait()
+                        continue
+                    if self.limit is not None and \
+                            self.remaining <= self.limit * PREFETCH_RESERVE:
+                        raise RateLimitExceededException(
+                            403, {"message": "Saving the rest of the API "
+                                             "rate limit for requests you "
+                                             "make"}, None
+                        )
+                    if deadline is None:
+                        delay = self.backoff()
+                        if delay > 0:
+                            logger.debug(f"Rate limit is close, waiting "
+                                         f"{delay:.1f}s")
+                        deadline = time() + delay
+                    if deadline <= time():
+                        break
+                    self.condition.wait(deadline - time())
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    def release(self, priority: int = USER_PRIORITY):
+        """
+        Mark a request as done.
+
+        :param priority: The priority that was passed to acquire().
+        """
+        if priority != USER_PRIORITY:
+            return
+        with self.condition:
+            self.user_requests -= 1
+            self.condition.notify_all()
+
+    def reset_text(self) -> str:
+        """
+        Get when the rate limit resets, for showing to the user.
+
+        :return: A string like "14:05", or "an unknown time".
+        """
+        if self.reset is None:
+            return "an unknown time"
+        return datetime.fromtimestamp(self.reset).strftime("%H:%M")
+
+
+class ReleaseAsset:
+    def __init__(self, data: dict):
+        """
+        A release asset, with the attributes of PyGithub's GitReleaseAsset
+        that are used.
+
+        :param data: The asset JSON from the GitHub API.
+        """
+        self.id = data["id"]
+        self.name = data["name"]
+        self.size = data["size"]
+        self.browser_download_url = data["browser_download_url"]
+        self.digest = data.get("digest")
+
+    def __repr__(self) -> str:
+        return f"<ReleaseAsset name={self.name!r}>"
+
+
+class Release:
+    def __init__(self, data: dict):
+        """
+        A release, with the attributes of PyGithub's GitRelease that are used.
+        The assets come with the release, so get_assets() doesn't make a
+        request.
+
+        :param data: The release JSON from the GitHub API.
+        """
+        self.id = data["id"]
+        self.tag_name = data["tag_name"]
+        self.title = data["name"] or data["tag_name"]
+        self.html_url = data["html_url"]
+        self.published_at = datetime.fromisoformat(
+            data["published_at"].replace("Z", "+00:00")
+        )
+        self.assets = [ReleaseAsset(asset) for asset in data["assets"]]
+
+    def get_assets(self) -> list[ReleaseAsset]:
+        """
+        Get the assets of this release.
+
+        :return: A list of ReleaseAssets.
+        """
+        return self.assets
+
+    def __repr__(self) -> str:
+        return f"<Release title={self.title!r}>"
+
+
+class GitHubAPI:
+    def __init__(self, token: str, cache: ResponseCache,
+                 session: Union[requests.Session, None] = None,
+                 scheduler: Union[RequestScheduler, None] = None,
+                 api_url: str = API_URL):
+        """
+        Make a small client for the parts of the GitHub REST and GraphQL APIs
+        this program uses. Every GET goes through the ResponseCache: fresh
+        responses are used without a request, and stale ones are revalidated
+        with If-None-Match, which doesn't count against the rate limit when
+        GitHub answers 304 Not Modified.
+
+        :param token: The token to use to authenticate with the GitHub APIs.
+        :param cache: The ResponseCache to use.
+        :param session: The requests Session to use, or None to make one.
+        :param scheduler: The RequestScheduler to send requests through, or
+         None to make one.
+        :param api_url: The URL of the API, which can be changed to test
+         against a stub server.
+        """
+        self.api_url = api_url
+        self.token = token
+        self.cache = cache
+        self.session = session if session is not None else requests.Session()
+        self.scheduler = scheduler if scheduler is not None \
+            else RequestScheduler()
+
+    def get(self, path: str, priority: int = USER_PRIORITY) -> \
+            tuple[Any, Union[str, None]]:
+        """
+        Get something from the API.
+
+        :param path: The path and query, like "/repos/owner/repo/releases".
+        :param priority: USER_PRIORITY if the user is waiting for this, or
+         PREFETCH_PRIORITY.
+        :return: A tuple of the decoded JSON body and the Link header. (or
+         None)
+        """
+        url = self.api_url + path
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"token {self.token}"
+        }
+        key = cache_key(url, headers)
+        cached = self.cache.get(key)
+        if cached is not None and cached["expires"] > time():
+            logger.debug(f"Using cached response for {url}")
+            return cached["body"], cached["link"]
+        if cached is not None and cached["etag"] is not None:
+            headers["If-None-Match"] = cached["etag"]
+        self.scheduler.acquire(priority)
+        try:
+            logger.debug(f"Requesting {url}")
+            response = self.session.get(url, headers=headers,
+                                        timeout=API_TIMEOUT)
+        finally:
+            self.scheduler.release(priority)
+        self.scheduler.update(response.headers)
+        max_age = 0
+        match = MAX_AGE_PATTERN.search(response.headers.get("Cache-Control",
+                                                            ""))
+        if match is not None:
+            max_age = int(match.group(1))
+        if response.status_code == 304 and cached is not None:
+            logger.debug(f"{url} was not modified")
+            self.cache.refresh(key, max_age)
+            return cached["body"], cached["link"]
+        self.raise_for_status(response)
+        body = response.json()
+        link = response.headers.get("Link")
+        self.cache.put(key, response.headers.get("ETag"), link, max_age, body)
+        return body, link
+
+    def query(self, query: str, variables: dict,
+              priority: int = USER_PRIORITY) -> Any:
+        """
+        Run a GraphQL query. Responses are cached for GRAPHQL_MAX_AGE seconds.
+
+        :param query: The GraphQL query.
+        :param variables: The variables of the query.
+        :param priority: USER_PRIORITY if the user is waiting for this, or
+         PREFETCH_PRIORITY.
+        :return: The decoded "data" of the response.
+        """
+        url = self.api_url + "/graphql"
+        headers = {"Authorization": f"bearer {self.token}"}
+        key = cache_key(f"{url}?{dumps(variables, sort_keys=True)}\n{query}",
+                        headers)
+        cached = self.cache.get(key)
+        if cached is not None and cached["expires"] > time():
+            logger.debug(f"Using cached response for {url} {variables}")
+            return cached["body"]
+        self.scheduler.acquire(priority)
+        try:
+            logger.debug(f"Querying {url} with {variables}")
+            response = self.session.post(url, headers=headers,
+                                         json={"query": query,
+                                               "variables": variables},
+                                         timeout=API_TIMEOUT)
+        finally:
+            self.scheduler.release(priority)
+        self.scheduler.update(response.headers)
+        self.raise_for_status(response)
+        body = response.json()
+        errors = body.get("errors")
+        if errors:
+            if any(error.get("type") == "NOT_FOUND" for error in errors):
+                exception = UnknownObjectException
+            elif any(error.get("type") == "RATE_LIMITED" for error in errors):
+                exception = RateLimitExceededException
+            else:
+                exception = GithubException
+            raise exception(response.status_code, body,
+                            dict(response.headers))
+        self.cache.put(key, None, None, GRAPHQL_MAX_AGE, body["data"])
+        return body["data"]
+
+    @staticmethod
+    def raise_for_status(response: requests.Response):
+        """
+        Raise the PyGithub exception that matches an error response.
+
+        :param response: The response.
+        """
+        if response.status_code < 400:
+            return
+        try:
+            data = response.json()
+        except ValueError:
+            data = response.text
+        if response.status_code == 401:
+            exception = BadCredentialsException
+        elif response.status_code in (403, 429) and \
+                response.headers.get("X-RateLimit-Remaining") == "0":
+            exception = RateLimitExceededException
+        elif response.status_code == 404:
+            exception = UnknownObjectException
+        else:
+            exception = GithubException
+        raise exception(response.status_code, data, dict(response.headers))
+
+    def get_releases(self, repo: str,
+                     graphql: bool = False) -> "ReleasePages":
+        """
+        Get the releases of a repository.
+
+        :param repo: The repository, like "owner/repo".
+        :param graphql: Whether to load the releases with the GraphQL API
+         instead of the REST API. The REST API already returns the assets
+         with each release, and its responses are revalidated with ETags,
+         which doesn't count against the rate limit when nothing changed.
+         GraphQL responses can't be revalidated, so every listing after
+         GRAPHQL_MAX_AGE costs a full query.
+        :return: A ReleasePages.
+        """
+        if graphql:
+            return GraphQLReleasePages(self, repo)
+        return ReleasePages(self, repo)
+
+
+class ReleasePages:
+    def __init__(self, api: GitHubAPI, repo: str):
+        """
+        The pages of releases of a repository, loaded on demand. Like
+        PyGithub's PaginatedList, pages are numbered from 0. How many pages
+        there are isn't known up front: the last page is found when a page
+        comes without a "next" link.
+
+        :param api: The GitHubAPI to use.
+        :param repo: The repository, like "owner/repo".
+        """
+        self.api = api
+        self.repo = repo
+        self.pages = {}
+        self.loading = set()
+        self.fetching = {}
+        self.last_page = None
+        self.lock = Lock()
+
+    def page_path(self, page: int) -> str:
+        """
+        Get the API path to a page of releases.
+
+        :param page: The page number, starting from 0.
+        :return: A string.
+        """
+        return f"/repos/{self.repo}/releases?per_page={RELEASES_PER_PAGE}" \
+               f"&page={page + 1}"
+
+    def exists(self, page: int) -> bool:
+        """
+        Get whether a page might have releases on it.
+
+        :param page: The page number, starting from 0.
+        :return: A bool. True if unknown.
+        """
+        with self.lock:
+            return page >= 0 and \
+                (self.last_page is None or page <= self.last_page)
+
+    def is_loaded(self, page: int) -> bool:
+        """
+        Get whether a page of releases is in memory, so get_page won't block.
+
+        :param page: The page number, starting from 0.
+        :return: A bool.
+        """
+        with self.lock:
+            return page in self.pages
+
+    def get_page(self, page: int,
+                 priority: int = USER_PRIORITY) -> list[Release]:
+        """
+        Get a page of releases. Pages are kept in memory once loaded. If the
+        page is already being requested, like by a prefetch, this waits for
+        that request instead of sending another one.
+
+        :param page: The page number, starting from 0.
+        :param priority: USER_PRIORITY if the user is waiting for this, or
+         PREFETCH_PRIORITY.
+        :return: A list of Releases, which is empty past the last page.
+        """
+        while True:
+            with self.lock:
+                if page in self.pages:
+                    return self.pages[page]
+                fetching = self.fetching.get(page)
+                if fetching is None:
+                    fetching = self.fetching[page] = Event()
+                    break
+            logger.debug(f"Page {page} of {self.repo} is already being "
+                         f"requested, waiting")
+            # If that request fails, this one tries again
+            fetching.wait()
+        try:
+            releases, has_next = self.fetch_page(page, priority)
+            with self.lock:
+                if len(releases) == 0:
+                    last_page = page - 1
+                elif not has_next:
+                    last_page = page
+                else:
+                    last_page = None
+                if last_page is not None and (self.last_page is None or
+                                              last_page < self.last_page):
+                    logger.debug(f"Last page of {self.repo} is {last_page}")
+                    self.last_page = last_page
+                return self.pages.setdefault(page, releases)
+        finally:
+            with self.lock:
+                del self.fetching[page]
+            fetching.set()
+
+    def fetch_page(self, page: int,
+                   priority: int = USER_PRIORITY) -> tuple[list[Release],
+                                                           bool]:
+        """
+        Request a page of releases from GitHub.
+
+        :param page: The page number, starting from 0.
+        :param priority: USER_PRIORITY if the user is waiting for this, or
+         PREFETCH_PRIORITY.
+        :return: A tuple of a list of Releases and a bool on whether there is
+         a next page.
+        """
+        body, link = self.api.get(self.page_path(page), priority)
+        has_next = link is not None and \
+            NEXT_PAGE_PATTERN.search(link) is not None
+        return [Release(data) for data in body], has_next
+
+    def loaded(self) -> tuple[list[Release], int]:
+        """
+        Get every release on the pages loaded so far, in order.
+
+        :return: A tuple of a list of Releases and the number of the first
+         page that isn't loaded yet.
+        """
+        releases = []
+        page = 0
+        with self.lock:
+            while page in self.pages:
+                releases.extend(self.pages[page])
+                page += 1
+        return releases, page
+
+    def prefetch(self, pages: Iterable[int]):
+        """
+        Load pages of releases in a background thread, so they are in memory
+        when they are needed. Pages that don't exist or are already loaded or
+        loading are skipped.
+
+        :param pages: The page numbers, starting from 0.
+        """
+        wanted = [page for page in dict.fromkeys(pages) if self.exists(page)]
+        with self.lock:
+            wanted = [page for page in wanted
+                      if page not in self.pages and page not in self.loading]
+            self.loading.update(wanted)
+        if len(wanted) == 0:
+            return
+
+        def load():
+            try:
+                for page in wanted:
+                    try:
+                        self.get_page(page, PREFETCH_PRIORITY)
+                    except RateLimitExceededException as e:
+                        logger.debug(f"Not prefetching page {page}: {e}")
+                        break
+                    except Exception:
+                        logger.exception(f"Error while prefetching page "
+                                         f"{page}")
+                    finally:
+                        with self.lock:
+                            self.loading.discard(page)
+            finally:
+                with self.lock:
+                    self.loading.difference_update(wanted)
+
+        t = Thread(target=load, daemon=True)
+        logger.debug(f"Prefetching pages {wanted} with thread {t}")
+        t.start()
+
+
+class GraphQLReleasePages(ReleasePages):
+    def __init__(self, api: GitHubAPI, repo: str):
+        """
+        The pages of releases of a repository, loaded with the GraphQL API.
+        Each page comes with the name, size and URL of every asset in one
+        request. GraphQL pages are found by a cursor from the page before, so
+        getting a page loads the pages before it first.
+
+        :param api: The GitHubAPI to use.
+        :param repo: The repository, like "owner/repo".
+        """
+        super().__init__(api, repo)
+        self.cursors = {}
+
+    def fetch_page(self, page: int,
+                   priority: int = USER_PRIORITY) -> tuple[list[Release],
+                                                           bool]:
+        """
+        Request a page of releases from GitHub.
+
+        :param page: The page number, starting from 0.
+        :param priority: USER_PRIORITY if the user is waiting for this, or
+         PREFETCH_PRIORITY.
+        :return: A tuple of a list of Releases and a bool on whether there is
+         a next page.
+        """
+        after = None
+        if page > 0:
+            with self.lock:
+                known = page - 1 in self.cursors
+            if not known:
+                self.get_page(page - 1, priority)
+            with self.lock:
+                after = self.cursors.get(page - 1)
+            if after is None:
+                return [], False
+        owner, name = self.repo.split("/")
+        data = self.api.query(RELEASES_QUERY, {
+            "owner": owner, "name": name, "first": RELEASES_PER_PAGE,
+            "after": after
+        }, priority)
+        releases = data["repository"]["releases"]
+        page_info = releases["pageInfo"]
+        with self.lock:
+            self.cursors[page] = page_info["endCursor"] \
+                if page_info["hasNextPage"] else None
+        return [Release(graphql_to_rest(node)) for node in releases["nodes"]
+                if node["publishedAt"] is not None], page_info["hasNextPage"]
+
+
+def graphql_to_rest(node: dict) -> dict:
+    """
+    Turn a release from the GraphQL API into the shape the REST API gives it,
+    so it can be passed to Release.
+
+    :param node: The release node of the GraphQL response.
+    :return: A dictionary.
+    """
+    return {
+        "id": node["databaseId"],
+        "tag_name": node["tagName"],
+        "name": node["name"],
+        "html_url": node["url"],
+        "published_at": node["publishedAt"],
+        "assets": [{
+            "id": asset["databaseId"],
+            "name": asset["name"],
+            "size": asset["size"],
+            "browser_download_url": asset["downloadUrl"]
+        } for asset in node["releaseAssets"]["nodes"]]
+    }
@@ -19,6 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
+import os
 from sys import platform
 
 from helpers.create_logger import create_logger
@@ -31,6 +32,11 @@ LINUX = "linux"
 
 logger.debug(f"OS is {platform}")
 
+# The umask can only be read by setting it, so read it once on import before
+# any threads could be creating files
+UMASK = os.umask(0)
+os.umask(UMASK)
+
 
 def on_windows() -> bool:
     """
@@ -57,3 +63,15 @@ def on_linux() -> bool:
     :return: A bool.
     """
     return platform == LINUX
+
+
+def default_mode(directory: bool = False) -> int:
+    """
+    Get the permissions a new file or directory gets by default, for files
+    made by something (like tempfile) that gives them stricter permissions.
+
+    :param directory: Whether to get the mode for a directory instead of a
+     file.
+    :return: An integer, to pass to os.chmod.
+    """
+    return (0o777 if directory else 0o666) & ~UMASK
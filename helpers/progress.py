@@ -0,0 +1,238 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+from helpers.create_logger import create_logger
+from helpers.file_size import ByteSize
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+# How much of the throughput estimate comes from the newest measurement
+RATE_SMOOTHING = 0.3
+
+
+def format_count(got: int, total: int, status: str) -> str:
+    """
+    Format a status with a count, like "Extracting ZIP file... (3 / 10)".
+
+    :param got: How many items are done.
+    :param total: How many items there are.
+    :param status: The status.
+    :return: A string.
+    """
+    return f"{status} ({got} / {total})"
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration like "1:05" or "1:02:05".
+
+    :param seconds: The duration in seconds.
+    :return: A string.
+    """
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 60 * 60)
+    minutes, seconds = divmod(seconds, 60)
+    if hours > 0:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
+
+
+class ProgressReporter:
+    def __init__(self, callback: Callable[[int, int, str], None],
+                 interval: float = 0.1):
+        """
+        Make a ProgressReporter, which can be passed anywhere a pb_func is
+        taken. Updates are passed on to the callback at most once per
+        interval, except for the last update of a step and updates with a new
+        status, so reporting every chunk of a download costs next to nothing.
+
+        :param callback: The function to pass updates to. Will be passed 2
+         integers and a string positionally with the first being how far, the
+         second being the total, and the third being a status bar.
+        :param interval: The least time between updates in seconds.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.lock = Lock()
+        self.last_time = None
+        self.last_status = None
+        self.pending = None
+        self.rate_status = None
+        self.rate_sample = None
+        self.rate = None
+
+    def should_emit(self, got: int, total: int, status: str) -> bool:
+        """
+        Figure out whether an update should be passed on now, and remember it
+        for flush() if not. Must be called with the lock held.
+
+        :param got: How far.
+        :param total: The total.
+        :param status: The status.
+        :return: A bool.
+        """
+        now = monotonic()
+        if self.last_time is None or status != self.last_status or \
+                got >= total or now - self.last_time >= self.interval:
+            self.last_time = now
+            self.last_status = status
+            self.pending = None
+            return True
+        return False
+
+    def __call__(self, got: int, total: int, status: str):
+        """
+        Report progress.
+
+        :param got: How far.
+        :param total: The total.
+        :param status: The status.
+        """
+        with self.lock:
+            if not self.should_emit(got, total, status):
+                self.pending = (got, total, status, None)
+                return
+        self.callback(got, total, status)
+
+    def report_bytes(self, got: int, total: int, status: str):
+        """
+        Report progress in bytes. The status is only formatted when the
+        update is passed on, with the sizes, throughput and time left added.
+
+        :param got: How many bytes are done.
+        :param total: How many bytes there are.
+        :param status: The status, like "Downloading 4 files".
+        """
+        with self.lock:
+            if not self.should_emit(got, total, status):
+                self.pending = (got, total, status, self.format_bytes)
+                return
+            text = self.format_bytes(got, total, status)
+        self.callback(got, total, text)
+
+    def report_count(self, got: int, total: int, status: str):
+        """
+        Report progress in items, like files. The status is only formatted
+        when the update is passed on, with the count added.
+
+        :param got: How many items are done.
+        :param total: How many items there are.
+        :param status: The status, like "Extracting ZIP file...".
+        """
+        with self.lock:
+            if not self.should_emit(got, total, status):
+                self.pending = (got, total, status, format_count)
+                return
+        self.callback(got, total, format_count(got, total, status))
+
+    def format_bytes(self, got: int, total: int, status: str) -> str:
+        """
+        Update the throughput estimate and format a status with it. Must be
+        called with the lock held.
+
+        :param got: How many bytes are done.
+        :param total: How many bytes there are.
+        :param status: The status.
+        :return: A string.
+        """
+        now = monotonic()
+        if status != self.rate_status:
+            self.rate_status = status
+            self.rate_sample = (now, got)
+            self.rate = None
+        else:
+            then, was = self.rate_sample
+            if now > then:
+                rate = max(got - was, 0) / (now - then)
+                if self.rate is None:
+                    self.rate = rate
+                else:
+                    self.rate += (rate - self.rate) * RATE_SMOOTHING
+                self.rate_sample = (now, got)
+        text = f"{status} - {str(ByteSize(got))} / {str(ByteSize(total))}"
+        if self.rate is not None and self.rate > 0:
+            text += f" ({str(ByteSize(self.rate))}/s"
+            if total > got:
+                text += f", {format_duration((total - got) / self.rate)} left"
+            text += ")"
+        return text
+
+    def flush(self):
+        """
+        Pass on the last update that was held back, if any.
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = None
+            if pending is None:
+                return
+            got, total, text, formatter = pending
+            if formatter is not None:
+                text = formatter(got, total, text)
+        self.callback(got, total, text)
+
+
+def byte_progress(pb_func: Callable) -> Callable[[int, int, str], None]:
+    """
+    Get a function to report progress in bytes with.
+
+    :param pb_func: A ProgressReporter, or any function that takes 2 integers
+     and a string.
+    :return: ProgressReporter.report_bytes if pb_func is a ProgressReporter,
+     otherwise a function that adds the sizes to the status and calls pb_func.
+    """
+    if isinstance(pb_func, ProgressReporter):
+        return pb_func.report_bytes
+    return lambda got, total, status: \
+        pb_func(got, total, f"{status} - {str(ByteSize(got))} / "
+                            f"{str(ByteSize(total))}")
+
+
+def count_progress(pb_func: Callable) -> Callable[[int, int, str], None]:
+    """
+    Get a function to report progress in items with.
+
+    :param pb_func: A ProgressReporter, or any function that takes 2 integers
+     and a string.
+    :return: ProgressReporter.report_count if pb_func is a ProgressReporter,
+     otherwise a function that adds the count to the status and calls
+     pb_func.
+    """
+    if isinstance(pb_func, ProgressReporter):
+        return pb_func.report_count
+    return lambda got, total, status: \
+        pb_func(got, total, format_count(got, total, status))
+
+
+def finish_progress(pb_func: Callable):
+    """
+    Show the last update of a step that is done, in case a ProgressReporter
+    held it back. (like when a step ends before reaching its total)
+
+    :param pb_func: A ProgressReporter, or any function that takes 2 integers
+     and a string. Nothing is done if it isn't a ProgressReporter.
+    """
+    if isinstance(pb_func, ProgressReporter):
+        pb_func.flush()
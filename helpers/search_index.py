@@ -0,0 +1,241 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from collections import defaultdict
+from math import ceil
+from typing import Iterable, Union
+
+from helpers.create_logger import create_logger
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+# The longest n-gram that is indexed
+MAX_GRAM = 3
+# Queries shorter than this are never matched fuzzily
+MIN_FUZZY_LENGTH = 4
+# Queries at least this long may have 2 typos instead of 1
+TWO_TYPO_LENGTH = 8
+# Trigrams found in more than this share of keys (like "ada" and "fru" in a
+# bundle full of adafruit_*) say nothing about which key was meant, so they
+# aren't used to find fuzzy candidates
+COMMON_GRAM_SHARE = 0.5
+# A key must share at least this share of the query's trigrams to be a fuzzy
+# candidate
+MIN_TRIGRAM_SHARE = 0.25
+# The most fuzzy candidates that the edit distance is computed for
+FUZZY_CANDIDATES = 20
+
+EXACT = 0
+PREFIX = 1
+SUBSTRING = 2
+FUZZY = 3
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize text for searching, so that case and - vs _ don't matter.
+
+    :param text: A string.
+    :return: A string.
+    """
+    return text.lower().replace("-", "_")
+
+
+def grams(text: str, size: int) -> set[str]:
+    """
+    Get every n-gram of a string.
+
+    :param text: A string.
+    :param size: The length of each n-gram.
+    :return: A set of strings.
+    """
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def max_typos(query: str) -> int:
+    """
+    Get how many typos a query may have and still match fuzzily.
+
+    :param query: The normalized query.
+    :return: An integer.
+    """
+    if len(query) < MIN_FUZZY_LENGTH:
+        return 0
+    if len(query) < TWO_TYPO_LENGTH:
+        return 1
+    return 2
+
+
+def substring_distance(query: str, text: str,
+                       limit: int) -> Union[int, None]:
+    """
+    Get the Damerau-Levenshtein distance (optimal string alignment, so
+    swapping 2 neighbouring letters is 1 typo) between a query and the
+    closest substring of some text.
+
+    :param query: The normalized query.
+    :param text: The normalized text to look in.
+    :param limit: The largest distance that is of interest.
+    :return: The distance, or None if it is more than the limit.
+    """
+    length = len(query)
+    # The text can start anywhere, so skipping the start of it is free
+    before = None
+    previous = list(range(length + 1))
+    best = previous[length]
+    for j in range(1, len(text) + 1):
+        current = [0] * (length + 1)
+        for i in range(1, length + 1):
+            distance = min(previous[i] + 1, current[i - 1] + 1,
+                           previous[i - 1] + (query[i - 1] != text[j - 1]))
+            if i > 1 and j > 1 and query[i - 1] == text[j - 2] and \
+                    query[i - 2] == text[j - 1]:
+                distance = min(distance, before[i - 2] + 1)
+            current[i] = distance
+        # And so is skipping the end of it
+        best = min(best, current[length])
+        before, previous = previous, current
+    return best if best <= limit else None
+
+
+class SearchIndex:
+    def __init__(self, entries: Iterable[tuple[str, Iterable[str]]]):
+        """
+        Make a SearchIndex, an n-gram index over a list of keys that supports
+        ranked substring and typo tolerant matching.
+
+        :param entries: An iterable of tuples of a key (which is what searches
+         return) and the strings that key can be found by, like its name and
+         PyPI name. Strings that are None are ignored.
+        """
+        self.keys = []
+        self.strings = []
+        self.postings = defaultdict(set)
+        for key, strings in sorted(entries, key=lambda entry: entry[0]):
+            key_id = len(self.keys)
+            self.keys.append(key)
+            # A PyPI name often normalizes to the module name, so drop repeats
+            normalized = tuple(dict.fromkeys(normalize(s) for s in strings
+                                             if s is not None))
+            self.strings.append(normalized)
+            for string in normalized:
+                for size in range(1, MAX_GRAM + 1):
+                    for gram in grams(string, size):
+                        self.postings[gram].add(key_id)
+        logger.debug(f"Indexed {len(self.keys)} keys with "
+                     f"{len(self.postings)} n-grams")
+
+    def rank(self, key_id: int, query: str) -> Union[tuple[int, int], None]:
+        """
+        Figure out how well a key matches a query without using n-grams.
+
+        :param key_id: The index of the key.
+        :param query: The normalized query.
+        :return: A tuple of the match type (EXACT, PREFIX or SUBSTRING) and the
+         position of the match, or None if no string contains the query.
+        """
+        best = None
+        for string in self.strings[key_id]:
+            position = string.find(query)
+            if position == -1:
+                continue
+            if string == query:
+                match = (EXACT, 0)
+            elif position == 0:
+                match = (PREFIX, 0)
+            else:
+                match = (SUBSTRING, position)
+            if best is None or match < best:
+                best = match
+        return best
+
+    def fuzzy_candidates(self, query_grams: set[str], typos: int,
+                         matched: set[int]) -> list[int]:
+        """
+        Find the keys worth computing the edit distance for, best first.
+
+        :param query_grams: The trigrams of the normalized query.
+        :param typos: How many typos the query may have.
+        :param matched: The keys that already matched without typos, which
+         are skipped.
+        :return: A list of at most FUZZY_CANDIDATES key indices.
+        """
+        common = COMMON_GRAM_SHARE * len(self.keys)
+        useful = [gram for gram in query_grams
+                  if len(self.postings.get(gram, ())) <= common]
+        if len(useful) == 0:
+            useful = list(query_grams)
+        shared = defaultdict(int)
+        for gram in useful:
+            for key_id in self.postings.get(gram, ()):
+                shared[key_id] += 1
+        # A typo changes at most 4 of the query's trigrams (swapping 2
+        # letters changes 4), so a key that shares fewer than all but 4 per
+        # typo of them can't match
+        needed = max(len(useful) - 4 * typos,
+                     ceil(MIN_TRIGRAM_SHARE * len(useful)), 1)
+        candidates = [key_id for key_id, count in shared.items()
+                      if count >= needed and key_id not in matched]
+        candidates.sort(key=lambda key_id: (-shared[key_id], key_id))
+        return candidates[:FUZZY_CANDIDATES]
+
+    def search(self, query: str, limit: Union[int, None] = None) -> list[str]:
+        """
+        Search for keys. Exact matches come first, then keys that start with
+        the query, then keys that contain it, then keys that contain it with
+        a typo or two, fewest typos first and then by how many of the query's
+        trigrams they share.
+
+        :param query: The string to search for.
+        :param limit: The maximum number of results, or None for all of them.
+        :return: A list of keys, best match first. If the query is empty,
+         every key in sorted order.
+        """
+        query = normalize(query.strip())
+        if query == "":
+            return self.keys[:limit]
+        size = min(len(query), MAX_GRAM)
+        query_grams = grams(query, size)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for key_id in self.postings.get(gram, ()):
+                shared[key_id] += 1
+        results = []
+        matched = set()
+        for key_id, count in shared.items():
+            if count != len(query_grams):
+                continue
+            match = self.rank(key_id, query)
+            if match is not None:
+                results.append((match[0], 0, match[1], key_id))
+                matched.add(key_id)
+        typos = max_typos(query)
+        if typos > 0:
+            for key_id in self.fuzzy_candidates(query_grams, typos, matched):
+                distances = [substring_distance(query, string, typos)
+                             for string in self.strings[key_id]]
+                distances = [d for d in distances if d is not None]
+                if len(distances) > 0:
+                    results.append((FUZZY, min(distances),
+                                    -shared[key_id] / len(query_grams),
+                                    key_id))
+        results.sort()
+        return [self.keys[result[3]] for result in results[:limit]]
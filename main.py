@@ -46,6 +46,8 @@ def main():
         show_error(gui, title="CircuitPython Bundle Manager: Error!",
                    message=f"Fatal error encountered!",
                    detail=str(e))
+    finally:
+        gui.cpybm.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from collections import Counter
+from json import dumps, loads
+from pathlib import Path
+from shutil import move
+from threading import RLock
+from time import time
+from typing import Union
+
+from helpers.create_logger import create_logger
+from helpers.github_api import ReleaseAsset
+from helpers.singleton import Singleton
+from managers.object_manager import HASH_NAME, hash_file
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+CACHE_DIR = ".cache"
+CACHE_INDEX_NAME = "cache.json"
+
+
+class AssetCacheManager(metaclass=Singleton):
+    def __init__(self, bundle_path: Path, max_size: int):
+        """
+        Make an AssetCacheManager, which keeps the release assets that were
+        downloaded so adding a release again doesn't need the network. Assets
+        are found by their ID and stored under their digest, and the least
+        recently used ones are removed when the cache grows past its size.
+        Assets that are pinned by a download that is using them are never
+        removed.
+
+        :param bundle_path: The path to the bundles.
+        :param max_size: The most bytes the cache can keep.
+        """
+        self.path = bundle_path / CACHE_DIR
+        self.index_path = self.path / CACHE_INDEX_NAME
+        self.max_size = max_size
+        self.lock = RLock()
+        self.entries = {}
+        self.pins = Counter()
+        self.load_from_disk()
+
+    def load_from_disk(self):
+        """
+        Load the cache's index from the disk, forgetting about entries whose
+        files are gone.
+        """
+        logger.debug(f"Loading asset cache index from {self.index_path}")
+        with self.lock:
+            try:
+                entries = loads(self.index_path.read_text())
+            except (FileNotFoundError, ValueError):
+                entries = {}
+            self.entries = {key: entry for key, entry in entries.items()
+                            if self.file_path(entry["digest"]).exists()}
+
+    def save_to_disk(self):
+        """
+        Save the cache's index to the disk.
+        """
+        with self.lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.index_path.write_text(dumps(self.entries, indent=2))
+
+    def file_path(self, digest: str) -> Path:
+        """
+        Get where an asset with a digest is stored.
+
+        :param digest: The hex digest of the asset.
+        :return: A Path.
+        """
+        return self.path / digest
+
+    @staticmethod
+    def key(asset: ReleaseAsset) -> str:
+        """
+        Get the key an asset is cached under.
+
+        :param asset: The release asset.
+        :return: A string.
+        """
+        return str(asset.id)
+
+    @property
+    def size(self) -> int:
+        """
+        Get how many bytes the cache is using.
+
+        :return: An int.
+        """
+        with self.lock:
+            digests = {entry["digest"]: entry["size"]
+                       for entry in self.entries.values()}
+            return sum(digests.values())
+
+    def get(self, asset: ReleaseAsset,
+            pin: bool = False) -> Union[Path, None]:
+        """
+        Get an asset from the cache.
+
+        :param asset: The release asset.
+        :param pin: Whether to pin the cached file, so it isn't removed until
+         unpin() is called with its path.
+        :return: The path to the cached file, or None if the asset isn't
+         cached or the cached file doesn't match the asset anymore.
+        """
+        with self.lock:
+            entry = self.entries.get(self.key(asset))
+            if entry is None:
+                return None
+            path = self.file_path(entry["digest"])
+            if entry["size"] != asset.size or not path.exists() or \
+                    path.stat().st_size != entry["size"] or \
+                    asset.digest is not None and \
+                    asset.digest != f"{HASH_NAME}:{entry['digest']}":
+                logger.debug(f"Cached copy of {asset.name} is stale")
+                self.remove(self.key(asset))
+                return None
+            entry["last_used"] = time()
+            if pin:
+                self.pins[entry["digest"]] += 1
+            self.save_to_disk()
+            logger.debug(f"Found {asset.name} in cache at {path}")
+            return path
+
+    def put(self, asset: ReleaseAsset, path: Path, pin: bool = False) -> Path:
+        """
+        Move a downloaded asset into the cache. The cache isn't trimmed, so
+        the returned path stays valid until trim() is called, or until it is
+        unpinned if it was pinned.
+
+        :param asset: The release asset.
+        :param path: The path to the downloaded file. It is moved.
+        :param pin: Whether to pin the cached file, so it isn't removed until
+         unpin() is called with its path.
+        :return: The path to the cached file.
+        """
+        digest = hash_file(path)
+        with self.lock:
+            cached_path = self.file_path(digest)
+            self.path.mkdir(parents=True, exist_ok=True)
+            if cached_path.exists():
+                path.unlink()
+            else:
+                move(path, cached_path)
+            self.entries[self.key(asset)] = {
+                "name": asset.name,
+                "size": cached_path.stat().st_size,
+                "digest": digest,
+                "last_used": time()
+            }
+            if pin:
+                self.pins[digest] += 1
+            self.save_to_disk()
+            logger.debug(f"Cached {asset.name} at {cached_path}")
+            return cached_path
+
+    def unpin(self, path: Path):
+        """
+        Let a file from get() or put() be removed again. If it was removed
+        from the cache while it was pinned, it is deleted now.
+
+        :param path: The path to the cached file.
+        """
+        digest = path.name
+        with self.lock:
+            self.pins[digest] -= 1
+            if self.pins[digest] > 0:
+                return
+            del self.pins[digest]
+            if not self.is_used(digest):
+                logger.debug(f"Deleting {path}, which was unpinned")
+                path.unlink(missing_ok=True)
+
+    def is_used(self, digest: str) -> bool:
+        """
+        Check whether a cached file is pinned or belongs to an entry.
+
+        :param digest: The hex digest of the file.
+        :return: A bool.
+        """
+        with self.lock:
+            return self.pins[digest] > 0 or \
+                any(entry["digest"] == digest
+                    for entry in self.entries.values())
+
+    def remove(self, key: str):
+        """
+        Remove an entry from the cache, and its file if no other entry uses
+        it and it isn't pinned.
+
+        :param key: The key of the entry.
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            if not self.is_used(entry["digest"]):
+                self.file_path(entry["digest"]).unlink(missing_ok=True)
+            self.save_to_disk()
+
+    def trim(self, max_size: Union[int, None] = None) -> int:
+        """
+        Remove the least recently used assets until the cache fits. Pinned
+        assets are skipped, so the cache may not fit afterwards.
+
+        :param max_size: The size to trim to in bytes. Defaults to
+         self.max_size.
+        :return: How many bytes were freed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        with self.lock:
+            before = self.size
+            by_age = sorted(self.entries.items(),
+                            key=lambda item: item[1]["last_used"])
+            for key, entry in by_age:
+                if self.size <= max_size:
+                    break
+                if self.pins[entry["digest"]] > 0:
+                    logger.debug(f"Not evicting {entry['name']}, it is in "
+                                 f"use")
+                    continue
+                logger.debug(f"Evicting {entry['name']} from cache")
+                self.remove(key)
+            freed = before - self.size
+        logger.debug(f"Trimmed asset cache by {freed} bytes")
+        return freed
+
+    def clear(self) -> int:
+        """
+        Remove everything from the cache that isn't pinned.
+
+        :return: How many bytes were freed.
+        """
+        return self.trim(0)
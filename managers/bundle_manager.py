@@ -19,53 +19,443 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
+import marshal
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from struct import Struct, error as StructError
+from sys import intern
+from threading import Lock, RLock
+from typing import Iterable, Iterator, Sequence, Union
 
-from json import loads
+from json import dumps, loads
 import arrow
 
 from helpers.create_logger import create_logger
+from helpers.search_index import SearchIndex
 from helpers.singleton import Singleton
+from managers.index_manager import IndexManager
+from managers.object_manager import HASH_NAME, hash_file
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
+# Errors that mean a bundle is missing files or has a broken metadata.json
+LOAD_ERRORS = (FileNotFoundError, KeyError, ValueError)
 
-class Module:
-    def __init__(self, path: Path, data: dict):
+METADATA_NAME = "metadata.json"
+SIDECAR_NAME = "metadata.bin"
+SIDECAR_MAGIC = b"CPBM"
+SIDECAR_FORMAT = 1
+SIDECAR_HEADER = Struct("<4sHH")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+
+
+def make_record(metadata: dict) -> tuple:
+    """
+    Turn the contents of a metadata.json file into a record, which has
+    everything a Bundle needs already parsed.
+
+    :param metadata: The parsed contents of metadata.json.
+    :return: A tuple of the title, tag name, URL, release timestamp, bundle
+     paths and ModuleTable arrays.
+    """
+    return (metadata["title"], metadata["tag_name"], metadata["url"],
+            float(metadata["released"]), tuple(metadata["bundles"]),
+            ModuleTable(metadata["dependencies"]).to_arrays())
+
+
+def write_metadata_sidecar(path: Path, record: tuple):
+    """
+    Write a record to a binary sidecar file.
+
+    :param path: The path to the metadata.bin file.
+    :param record: A record from make_record().
+    """
+    logger.debug(f"Writing metadata sidecar to {path}")
+    header = SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_FORMAT,
+                                 marshal.version)
+    path.write_bytes(header + marshal.dumps(record))
+
+
+def read_metadata_sidecar(path: Path) -> Union[tuple, None]:
+    """
+    Read a record from a binary sidecar file.
+
+    :param path: The path to the metadata.bin file.
+    :return: The record, or None if the file is corrupt or was written by a
+     different format or Python version.
+    """
+    data = path.read_bytes()
+    try:
+        magic, sidecar_format, marshal_version = \
+            SIDECAR_HEADER.unpack_from(data)
+        if magic != SIDECAR_MAGIC or sidecar_format != SIDECAR_FORMAT or \
+                marshal_version != marshal.version:
+            logger.debug(f"Sidecar {path} is from a different format")
+            return None
+        return marshal.loads(data[SIDECAR_HEADER.size:])
+    except (StructError, ValueError, EOFError, TypeError):
+        logger.exception(f"Unable to read sidecar {path}")
+        return None
+
+
+def write_manifest(path: Path, files: dict[str, tuple[str, int]]):
+    """
+    Write a manifest of every file in a bundle, so the bundle can be checked
+    and compared without reading all of it.
+
+    :param path: The path to the manifest.json file.
+    :param files: A dictionary of each file's path relative to the bundle, in
+     POSIX form, to a tuple of its hex digest and size.
+    """
+    logger.debug(f"Writing manifest of {len(files)} files to {path}")
+    path.write_text(dumps({
+        "format": MANIFEST_FORMAT,
+        "hash": HASH_NAME,
+        "files": [{"path": name, "size": size, "digest": digest}
+                  for name, (digest, size) in sorted(files.items())]
+    }))
+
+
+def read_manifest(path: Path) -> Union[dict[str, tuple[str, int]], None]:
+    """
+    Read a manifest written by write_manifest().
+
+    :param path: The path to the manifest.json file.
+    :return: A dictionary of each file's path relative to the bundle to a
+     tuple of its hex digest and size, or None if there is no manifest or it
+     is from a different format.
+    """
+    try:
+        manifest = loads(path.read_text())
+        if manifest["format"] != MANIFEST_FORMAT or \
+                manifest["hash"] != HASH_NAME:
+            logger.debug(f"Manifest {path} is from a different format")
+            return None
+        return {entry["path"]: (entry["digest"], entry["size"])
+                for entry in manifest["files"]}
+    except LOAD_ERRORS + (TypeError, ):
+        return None
+
+
+def check_manifest(bundle_path: Path, files: dict[str, tuple[str, int]],
+                   full: bool = False) -> list[str]:
+    """
+    Find the files of a bundle that don't match its manifest.
+
+    :param bundle_path: The path to the bundle.
+    :param files: The manifest, from read_manifest().
+    :param full: Whether to hash every file, instead of only comparing sizes.
+    :return: A list of the paths from the manifest that are missing or
+     different.
+    """
+    bad = []
+    for name, (digest, size) in files.items():
+        file_path = bundle_path.joinpath(*name.split("/"))
+        try:
+            if file_path.stat().st_size != size or \
+                    full and hash_file(file_path) != digest:
+                bad.append(name)
+        except OSError:
+            bad.append(name)
+    return bad
+
+
+class ModuleTable:
+    def __init__(self, data: Union[dict, None] = None):
         """
-        Make a Module.
+        Make a ModuleTable, which holds the dependency data of every module in
+        a bundle once, no matter how many versions the bundle has. Each module
+        stem gets an integer id, and every field is stored in a list indexed
+        by that id. Strings are interned so they are shared between bundles.
 
-        :param path: The path to the module. Can be either a single file or a
-         directory. (package)
         :param data: A dictionary containing the dependencies for all modules.
+         If None, the table starts empty.
         """
-        self.path = path
-        self.name = path.name
-        if len(data) > 0:
-            self.is_package = data[self.path.stem]["package"]
-            self.pypi_name = data[self.path.stem]["pypi_name"]
-            self.version = data[self.path.stem]["version"]
-            self.repo = data[self.path.stem]["repo"]
-            self.dependencies = []
-            for dependency in data[self.path.stem]["dependencies"]:
-                self.dependencies.append(
-                    Module(self.path.parent / dependency, data)
-                )
+        self.stems = []
+        self.ids = {}
+        self.is_package = []
+        self.pypi_name = []
+        self.version = []
+        self.repo = []
+        self.dependencies = []
+        if data is None:
+            return
+        for stem, info in data.items():
+            self.add(stem, info)
+        for stem, info in data.items():
+            self.dependencies[self.ids[stem]] = tuple(
+                self.id_of(dependency) for dependency in info["dependencies"]
+            )
+
+    def __len__(self) -> int:
+        return len(self.stems)
+
+    @classmethod
+    def from_arrays(cls, arrays: Sequence) -> "ModuleTable":
+        """
+        Make a ModuleTable from the output of ModuleTable.to_arrays().
+
+        :param arrays: A sequence of the stems, is_package, pypi_name, version,
+         repo and dependencies arrays.
+        :return: A ModuleTable.
+        """
+        table = cls()
+        stems, is_package, pypi_name, version, repo, dependencies = arrays
+        table.stems = [intern(stem) for stem in stems]
+        table.ids = {stem: i for i, stem in enumerate(table.stems)}
+        table.is_package = list(is_package)
+        table.pypi_name = [None if s is None else intern(s) for s in pypi_name]
+        table.version = [None if s is None else intern(s) for s in version]
+        table.repo = [None if s is None else intern(s) for s in repo]
+        table.dependencies = [tuple(ids) for ids in dependencies]
+        return table
+
+    def to_arrays(self) -> tuple:
+        """
+        Get the contents of this table as plain tuples, which can be
+        marshalled or turned into JSON.
+
+        :return: A tuple of the stems, is_package, pypi_name, version, repo and
+         dependencies arrays.
+        """
+        return (tuple(self.stems), tuple(self.is_package),
+                tuple(self.pypi_name), tuple(self.version), tuple(self.repo),
+                tuple(self.dependencies))
+
+    def add(self, stem: str, info: Union[dict, None] = None) -> int:
+        """
+        Add a module to the table. Its dependencies are left empty.
+
+        :param stem: The name of the module without any file extension.
+        :param info: The module's entry in the dependency data, or None if it
+         isn't in there.
+        :return: The id of the module.
+        """
+        module_id = len(self.stems)
+        stem = intern(stem)
+        self.stems.append(stem)
+        self.ids[stem] = module_id
+        if info is None:
+            self.is_package.append(None)
+            self.pypi_name.append(None)
+            self.version.append(None)
+            self.repo.append(None)
         else:
-            self.is_package = None
-            self.pypi_name = None
-            self.version = None
-            self.repo = None
-            self.dependencies = []
+            self.is_package.append(info["package"])
+            self.pypi_name.append(intern(info["pypi_name"]))
+            self.version.append(intern(info["version"]))
+            self.repo.append(intern(info["repo"]))
+        self.dependencies.append(())
+        return module_id
+
+    def id_of(self, stem: str) -> int:
+        """
+        Get the id of a module, adding it without any data if it isn't in the
+        table.
+
+        :param stem: The name of the module without any file extension.
+        :return: The id of the module.
+        """
+        module_id = self.ids.get(stem)
+        if module_id is None:
+            module_id = self.add(stem)
+        return module_id
+
+
+class Module:
+    __slots__ = ("graph", "id", "name")
+
+    def __init__(self, graph: "DependencyGraph", module_id: int, name: str):
+        """
+        Make a Module. Everything except the file name is looked up in the
+        ModuleTable of the DependencyGraph that owns this module.
+
+        :param graph: The DependencyGraph this module is in.
+        :param module_id: The id of the module in the graph's ModuleTable.
+        :param name: The name of the file or directory (package) in the lib
+         folder.
+        """
+        self.graph = graph
+        self.id = module_id
+        self.name = intern(name)
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the path to the module. Can be either a single file or a
+        directory. (package)
+
+        :return: A Path.
+        """
+        return self.graph.modules_path / self.name
+
+    @property
+    def stem(self) -> str:
+        return self.graph.table.stems[self.id]
+
+    @property
+    def is_package(self) -> Union[bool, None]:
+        return self.graph.table.is_package[self.id]
+
+    @property
+    def pypi_name(self) -> Union[str, None]:
+        return self.graph.table.pypi_name[self.id]
+
+    @property
+    def version(self) -> Union[str, None]:
+        return self.graph.table.version[self.id]
+
+    @property
+    def repo(self) -> Union[str, None]:
+        return self.graph.table.repo[self.id]
+
+    @property
+    def dependencies(self) -> list["Module"]:
+        """
+        Get the modules this module directly depends on.
+
+        :return: A list of the shared Modules in the DependencyGraph.
+        """
+        return [self.graph.node(dependency)
+                for dependency in self.graph.table.dependencies[self.id]]
+
+
+class DependencyGraph:
+    def __init__(self, modules_path: Path, names: list[str],
+                 table: ModuleTable):
+        """
+        Make a DependencyGraph, which holds one Module per module stem in a
+        bundle version. The edges are the integer ids in the bundle's
+        ModuleTable, so every Module's dependencies are the shared Module
+        objects in this graph.
+
+        :param modules_path: The path to the lib folder of the bundle version.
+        :param names: The names of the files and directories in the lib
+         folder.
+        :param table: The ModuleTable of the bundle.
+        """
+        self.modules_path = modules_path
+        self.table = table
+        self.nodes = {}
+        self._by_id = {}
+        self._closures = {}
+        for name in names:
+            module_id = table.id_of(Path(name).stem)
+            module = Module(self, module_id, name)
+            self._by_id[module_id] = module
+            self.nodes[module.stem] = module
+
+    def node(self, module_id: int) -> Module:
+        """
+        Get the Module for an id, making a placeholder if the module isn't
+        in the lib folder.
+
+        :param module_id: The id of the module in the ModuleTable.
+        :return: A Module.
+        """
+        module = self._by_id.get(module_id)
+        if module is None:
+            stem = self.table.stems[module_id]
+            logger.debug(f"Dependency {stem} is not in {self.modules_path}")
+            module = Module(self, module_id, stem)
+            self._by_id[module_id] = module
+            self.nodes[stem] = module
+        return module
+
+    def get_node(self, stem: str) -> Module:
+        """
+        Get the Module for a stem, making a placeholder if the module isn't
+        in the lib folder.
+
+        :param stem: The name of the module without any file extension.
+        :return: A Module.
+        """
+        return self.node(self.table.id_of(stem))
+
+    def transitive_dependencies(self, stem: str) -> tuple[Module, ...]:
+        """
+        Get every module a module depends on, directly or indirectly. Results
+        are memoized and dependency cycles are followed only once.
+
+        :param stem: The name of the module without any file extension.
+        :return: A tuple of Modules, not including the module itself, in the
+         order they were found.
+        """
+        start = self.table.id_of(stem)
+        if start in self._closures:
+            return tuple(self.node(i) for i in self._closures[start])
+        dependencies = self.table.dependencies
+        seen = {start}
+        found = []
+        stack = [start]
+        while len(stack) > 0:
+            current = stack.pop()
+            for dependency in dependencies[current]:
+                if dependency in seen:
+                    continue
+                seen.add(dependency)
+                found.append(dependency)
+                if dependency in self._closures:
+                    for indirect in self._closures[dependency]:
+                        if indirect not in seen:
+                            seen.add(indirect)
+                            found.append(indirect)
+                else:
+                    stack.append(dependency)
+        self._closures[start] = tuple(found)
+        return tuple(self.node(i) for i in self._closures[start])
+
+
+class BundleVersions(Mapping):
+    def __init__(self, bundle: "Bundle"):
+        """
+        Make a BundleVersions, a mapping of version names to dictionaries of
+        module names to Modules. A version's modules are only loaded from the
+        disk the first time that version is looked up.
+
+        :param bundle: The Bundle these versions belong to.
+        """
+        self.bundle = bundle
+        self._loaded = {}
+        self._lock = Lock()
+
+    def __getitem__(self, version: str) -> dict[str, Module]:
+        if version not in self.bundle.version_paths:
+            raise KeyError(version)
+        with self._lock:
+            if version not in self._loaded:
+                self._loaded[version] = self.bundle.load_version(version)
+            return self._loaded[version]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.bundle.versions)
+
+    def __len__(self) -> int:
+        return len(self.bundle.versions)
+
+    def is_loaded(self, version: str) -> bool:
+        """
+        Check whether a version's modules have been loaded yet.
+
+        :param version: The name of the version.
+        :return: A bool.
+        """
+        return version in self._loaded
 
 
 class Bundle:
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, cached: Union[dict, None] = None):
         """
-        Make a Bundle.
+        Make a Bundle. Only the metadata is loaded, the modules of each
+        version are loaded when they are first accessed through self.bundle.
 
         :param path: The path to the bundle. Inside the directory there should
          be a metadata.json file.
+        :param cached: The data from Bundle.to_index_data() the last time this
+         bundle was scanned. If given, the metadata files aren't read until
+         the ModuleTable is needed.
         """
         self.path = path
         self.title = None
@@ -74,76 +464,403 @@ class Bundle:
         self.released = None
         self.bundle_paths = []
         self.versions = []
-        self.module_dependencies = {}
-        self.bundle = {}
-        self.load_metadata()
-        self.load_modules()
+        self.version_paths = {}
+        self._module_table = None
+        self._table_lock = Lock()
+        self.graphs = {}
+        self.search_indexes = {}
+        self.bundle = BundleVersions(self)
+        if cached is None:
+            self.load_metadata()
+        else:
+            self.load_summary(cached["summary"])
+
+    @property
+    def module_table(self) -> ModuleTable:
+        """
+        Get the ModuleTable of the bundle, reading it from the metadata files
+        if the bundle was loaded from the index cache.
+
+        :return: A ModuleTable.
+        """
+        with self._table_lock:
+            if self._module_table is None:
+                logger.debug(f"Loading module table of {self.path}")
+                self._module_table = ModuleTable.from_arrays(
+                    self.read_record()[5]
+                )
+            return self._module_table
+
+    def load_version(self, version: str) -> dict[str, Module]:
+        """
+        Load the modules in a version of the bundle. You should probably
+        access self.bundle[version] instead, which only does this once.
+
+        :param version: The name of the version, like "7.x-mpy".
+        :return: A dictionary of module names to Modules.
+        """
+        modules_path = self.version_paths[version] / "lib"
+        names = [path.name for path in modules_path.glob("*")]
+        logger.debug(f"Found {len(names)} modules in {version} version")
+        graph = DependencyGraph(modules_path, names, self.module_table)
+        modules = {}
+        for name in names:
+            modules[name] = graph.nodes[Path(name).stem]
+        self.graphs[version] = graph
+        return modules
+
+    def dependency_graph(self, version: str) -> DependencyGraph:
+        """
+        Get the dependency graph of a version, loading it if needed.
+
+        :param version: The name of the version, like "7.x-mpy".
+        :return: A DependencyGraph.
+        """
+        _ = self.bundle[version]
+        return self.graphs[version]
+
+    def search_index(self, version: str) -> SearchIndex:
+        """
+        Get the search index of a version, which finds modules by their name
+        or PyPI name. It is made the first time it is needed.
+
+        :param version: The name of the version, like "7.x-mpy".
+        :return: A SearchIndex.
+        """
+        if version not in self.search_indexes:
+            modules = self.bundle[version]
+            self.search_indexes[version] = SearchIndex(
+                (name, (name, module.pypi_name))
+                for name, module in modules.items()
+            )
+        return self.search_indexes[version]
 
     def load_modules(self):
         """
-        Load the modules in the bundle.
+        Load the modules in every version of the bundle.
         """
         logger.debug("Loading modules")
-        for bundle in self.bundle_paths:
-            version = bundle.name
-            version = version.replace("adafruit-circuitpython-bundle-", "")
-            version = version.replace("circuitpython-community-bundle-", "")
-            version = version.replace(f"-{self.tag_name}", "")
-            modules_path = bundle / "lib"
-            logger.debug(f"Found {len(list(modules_path.glob('*')))} modules "
-                         f"in {version} version")
-            modules = {}
-            for path in modules_path.glob("*"):
-                modules[path.name] = Module(path, self.module_dependencies)
-            self.bundle[version] = modules
+        for version in self.versions:
+            _ = self.bundle[version]
 
-    def load_metadata(self):
+    def read_record(self) -> tuple:
         """
-        Load the metadata.
+        Read the metadata as a record. The metadata.bin sidecar is used if it
+        is at least as new as metadata.json, otherwise metadata.json is parsed
+        and the sidecar is (re)written for next time.
+
+        :return: A record, like make_record() makes.
         """
-        metadata_path = self.path / "metadata.json"
+        metadata_path = self.path / METADATA_NAME
+        sidecar_path = self.path / SIDECAR_NAME
+        try:
+            use_sidecar = sidecar_path.stat().st_mtime_ns >= \
+                metadata_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            use_sidecar = False
+        if use_sidecar:
+            logger.debug(f"Loading metadata from {sidecar_path}")
+            record = read_metadata_sidecar(sidecar_path)
+            if record is not None:
+                return record
         logger.debug(f"Loading metadata from {metadata_path}")
-        metadata = loads(metadata_path.read_text())
-        self.title = metadata["title"]
-        self.tag_name = metadata["tag_name"]
-        self.url = metadata["url"]
-        self.released = arrow.get(metadata["released"])
-        self.bundle_paths = [Path(p) for p in metadata["bundles"]]
+        record = make_record(loads(metadata_path.read_text()))
+        try:
+            write_metadata_sidecar(sidecar_path, record)
+        except OSError:
+            logger.exception(f"Unable to write {sidecar_path}")
+        return record
+
+    def load_metadata(self):
+        """
+        Load the metadata, including the ModuleTable.
+        """
+        self.load_record(self.read_record())
+
+    def load_summary(self, summary: Sequence):
+        """
+        Load everything in the metadata except for the ModuleTable.
+
+        :param summary: A sequence of the title, tag name, URL, release
+         timestamp and bundle paths.
+        """
+        title, tag_name, url, released, bundles = summary
+        self.title = title
+        self.tag_name = tag_name
+        self.url = url
+        self.released = arrow.get(released)
+        self.bundle_paths = [Path(p) for p in bundles]
         self.versions = []
+        self.version_paths = {}
         for bundle in self.bundle_paths:
             name = bundle.name
             name = name.replace("adafruit-circuitpython-bundle-", "")
             name = name.replace("circuitpython-community-bundle-", "")
             name = name.replace(f"-{self.tag_name}", "")
             logger.debug(f"Found bundle version: {name}")
+            name = intern(name)
             self.versions.append(name)
-        self.module_dependencies = metadata["dependencies"]
+            self.version_paths[name] = bundle
+
+    def load_record(self, record: Sequence):
+        """
+        Load the metadata from a record made by make_record().
+
+        :param record: A sequence of the title, tag name, URL, release
+         timestamp, bundle paths and ModuleTable arrays.
+        """
+        self.load_summary(record[:5])
+        with self._table_lock:
+            self._module_table = ModuleTable.from_arrays(record[5])
+
+    def to_summary(self) -> tuple:
+        """
+        Get the metadata without the ModuleTable, like load_summary() takes.
+
+        :return: A tuple.
+        """
+        return (self.title, self.tag_name, self.url,
+                self.released.timestamp(),
+                tuple(str(p) for p in self.bundle_paths))
+
+    def to_record(self) -> tuple:
+        """
+        Get the metadata as a record, like make_record() does.
+
+        :return: A tuple.
+        """
+        return self.to_summary() + (self.module_table.to_arrays(), )
+
+    def to_index_data(self) -> dict:
+        """
+        Get the data needed to remake this bundle without reading its
+        metadata files. The ModuleTable is left out, since it is much bigger
+        and is read from the metadata.bin sidecar when it is first needed.
+
+        :return: A JSON-serializable dictionary which can be passed as the
+         cached parameter of Bundle.
+        """
+        return {"summary": self.to_summary()}
 
 
 class BundleManager(metaclass=Singleton):
-    def __init__(self, bundle_path: Path):
+    def __init__(self, bundle_path: Path, index_path: Path,
+                 index_workers: int = 1, catalog=None):
         """
         Make a BundleManager.
 
         :param bundle_path: The path to the bundles.
+        :param index_path: The path to the JSON file where the bundle index is
+         cached.
+        :param index_workers: How many threads to load bundles with while
+         indexing. 1 loads them one at a time on the calling thread.
+        :param catalog: A CatalogManager to keep in sync with the bundles
+         found while indexing, or None.
         """
         self.bundle_path = bundle_path
+        self.index = IndexManager(index_path)
+        self.index_workers = index_workers
+        self.catalog = catalog
+        self.lock = RLock()
         self.bundles = []
+        self.failed_bundles = {}
         self.index_bundles()
 
-    def index_bundles(self):
+    def load_bundle(self, path: Path) -> tuple[Bundle, bool]:
         """
-        Search the bundle paths for bundles.
+        Load a bundle, from the index cache if it hasn't changed.
+
+        :param path: The path to the bundle.
+        :return: A tuple of the Bundle and a bool on whether it was loaded
+         from the index cache.
+        """
+        cached = self.index.get(path)
+        if cached is not None:
+            logger.debug(f"Loading bundle at {path} from index")
+            return Bundle(path, cached), True
+        return Bundle(path), False
+
+    def index_bundles(self, rebuild: bool = False,
+                      workers: Union[int, None] = None):
+        """
+        Search the bundle paths for bundles. Bundles that haven't changed since
+        the last index are loaded from the index cache. Bundles that fail to
+        load are skipped and recorded in self.failed_bundles. self.bundles is
+        sorted from newest to oldest release.
+
+        :param rebuild: Whether to throw away the index cache and scan every
+         bundle again.
+        :param workers: How many threads to load bundles with. Defaults to
+         self.index_workers.
+        """
+        with self.lock:
+            self._index_bundles(rebuild, workers)
+
+    def _index_bundles(self, rebuild: bool, workers: Union[int, None]):
+        """
+        Does the work of index_bundles() while holding self.lock.
         """
         logger.debug("Indexing bundles...")
-        self.bundles = []
-        for path in self.bundle_path.glob("*"):
-            if not path.is_dir():
+        if rebuild:
+            self.invalidate_index()
+        if workers is None:
+            workers = self.index_workers
+        paths = []
+        for path in sorted(self.bundle_path.glob("*")):
+            if not path.is_dir() or path.name.startswith("."):
                 continue
             logger.debug(f"Found bundle {path}")
-            try:
-                b = Bundle(path)
-            except FileNotFoundError:
-                logger.exception(f"Skipping over bundle at {path}")
-            else:
-                self.bundles.append(b)
+            paths.append(path)
+        if workers > 1 and len(paths) > 1:
+            logger.debug(f"Loading {len(paths)} bundles with {workers} threads")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self.load_bundle, path)
+                           for path in paths]
+                results = []
+                for path, future in zip(paths, futures):
+                    try:
+                        results.append((path, future.result(), None))
+                    except LOAD_ERRORS as e:
+                        results.append((path, None, e))
+        else:
+            results = []
+            for path in paths:
+                try:
+                    results.append((path, self.load_bundle(path), None))
+                except LOAD_ERRORS as e:
+                    results.append((path, None, e))
+        self.bundles = []
+        self.failed_bundles = {}
+        for path, result, error in results:
+            if error is not None:
+                logger.error(f"Skipping over bundle at {path}",
+                             exc_info=error)
+                self.failed_bundles[path] = error
+                self.index.invalidate(path)
+                continue
+            b, from_cache = result
+            if not from_cache:
+                self.index.put(path, b.to_index_data())
+            self.bundles.append(b)
+        self.bundles.sort(key=lambda b: b.released.timestamp(), reverse=True)
+        self.index.prune(paths)
+        self.index.save_to_disk()
+        if self.catalog is not None:
+            self.catalog.sync(self.bundles)
+
+    def update_bundles(self, paths: Iterable[Path]) -> tuple[list[Bundle],
+                                                             list[Path],
+                                                             list[Bundle]]:
+        """
+        Bring some bundles up to date without indexing all of them, like when
+        they were added, changed or removed on the disk.
+
+        :param paths: The paths of the bundles that may have changed.
+        :return: A tuple of the Bundles that were added, the paths of the
+         bundles that were removed and the Bundles that were reloaded because
+         they changed.
+        """
+        added = []
+        removed = []
+        updated = []
+        with self.lock:
+            existing = {b.path: b for b in self.bundles}
+            for path in paths:
+                old = existing.get(path)
+                if path.name.startswith(".") or not path.is_dir() or \
+                        not (path / METADATA_NAME).exists():
+                    if old is not None:
+                        logger.debug(f"Bundle at {path} was removed")
+                        self.remove_from_index(path)
+                        del existing[path]
+                        removed.append(path)
+                    continue
+                if old is not None and self.index.get(path) is not None:
+                    continue
+                try:
+                    b, from_cache = self.load_bundle(path)
+                except LOAD_ERRORS as e:
+                    logger.error(f"Skipping over bundle at {path}", exc_info=e)
+                    self.failed_bundles[path] = e
+                    if old is not None:
+                        self.remove_from_index(path)
+                        del existing[path]
+                        removed.append(path)
+                    continue
+                self.failed_bundles.pop(path, None)
+                if not from_cache:
+                    self.index.put(path, b.to_index_data())
+                if self.catalog is not None:
+                    self.catalog.add_bundle(b)
+                existing[path] = b
+                if old is None:
+                    logger.debug(f"Bundle at {path} was added")
+                    added.append(b)
+                else:
+                    logger.debug(f"Bundle at {path} was changed")
+                    updated.append(b)
+            self.bundles = sorted(existing.values(),
+                                  key=lambda b: b.released.timestamp(),
+                                  reverse=True)
+            self.index.save_to_disk()
+        return added, removed, updated
+
+    def remove_from_index(self, path: Path):
+        """
+        Forget about a bundle in the index cache and the catalog.
+
+        :param path: The path to the bundle.
+        """
+        self.index.invalidate(path)
+        if self.catalog is not None:
+            self.catalog.remove_bundle(path)
+
+    def invalidate_index(self, path: Union[Path, None] = None):
+        """
+        Mark a bundle in the index cache as stale, so it will be scanned again
+        on the next index.
+
+        :param path: The path to the bundle. If None, the entire index is
+         invalidated.
+        """
+        with self.lock:
+            self.index.invalidate(path)
+            self.index.save_to_disk()
+
+    def remove_bundle(self, path: Path):
+        """
+        Forget about a bundle that was deleted from the disk, so it isn't
+        listed anymore and doesn't stay in the index cache or the catalog.
+
+        :param path: The path to the bundle.
+        """
+        with self.lock:
+            self.remove_from_index(path)
+            self.bundles = [b for b in self.bundles if b.path != path]
+            self.failed_bundles.pop(path, None)
+            self.index.save_to_disk()
+
+    def rebuild_index(self):
+        """
+        Throw away the index cache and scan every bundle again.
+        """
+        self.index_bundles(rebuild=True)
+
+    def previous_bundle(self, released: float, is_community: bool) -> \
+            Union[Bundle, None]:
+        """
+        Find the newest bundle released before a time, to upgrade from.
+
+        :param released: The time the new release was released, as a
+         timestamp.
+        :param is_community: Whether to look for a community bundle instead of
+         an Adafruit bundle.
+        :return: A Bundle, or None if there are no older bundles.
+        """
+        with self.lock:
+            older = [bundle for bundle in self.bundles
+                     if bundle.released.timestamp() < released and
+                     bundle.title.endswith(" (community)") == is_community]
+        if len(older) == 0:
+            return None
+        return max(older, key=lambda bundle: bundle.released.timestamp())
@@ -0,0 +1,336 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import sqlite3
+from json import dumps
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Union
+
+from helpers.create_logger import create_logger
+from helpers.singleton import Singleton
+from managers.bundle_manager import Bundle
+from managers.index_manager import IndexManager
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+CATALOG_FORMAT = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bundles (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    tag_name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    released REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bundles_released ON bundles (released);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    bundle_id INTEGER NOT NULL REFERENCES bundles (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    UNIQUE (bundle_id, name)
+);
+CREATE INDEX IF NOT EXISTS versions_name ON versions (name);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    stem TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS module_versions (
+    id INTEGER PRIMARY KEY,
+    bundle_id INTEGER NOT NULL REFERENCES bundles (id) ON DELETE CASCADE,
+    module_id INTEGER NOT NULL REFERENCES modules (id),
+    version TEXT,
+    pypi_name TEXT,
+    repo TEXT,
+    is_package INTEGER,
+    UNIQUE (bundle_id, module_id)
+);
+CREATE INDEX IF NOT EXISTS module_versions_module
+    ON module_versions (module_id, version);
+CREATE INDEX IF NOT EXISTS module_versions_pypi_name
+    ON module_versions (pypi_name);
+CREATE TABLE IF NOT EXISTS dependencies (
+    module_version_id INTEGER NOT NULL
+        REFERENCES module_versions (id) ON DELETE CASCADE,
+    depends_on INTEGER NOT NULL REFERENCES modules (id),
+    PRIMARY KEY (module_version_id, depends_on)
+);
+CREATE INDEX IF NOT EXISTS dependencies_depends_on
+    ON dependencies (depends_on);
+"""
+
+
+class CatalogManager(metaclass=Singleton):
+    def __init__(self, catalog_path: Path):
+        """
+        Make a CatalogManager, which keeps an SQLite database of every
+        downloaded bundle, its versions, modules and dependencies, so
+        questions across bundles can be answered without loading them.
+
+        :param catalog_path: The path to the SQLite database file.
+        """
+        self.path = catalog_path
+        self.lock = Lock()
+        logger.debug(f"Opening catalog at {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.create_tables()
+
+    def create_tables(self):
+        """
+        Create the tables, throwing away the catalog if it was made by a
+        different version of this program.
+        """
+        with self.lock, self.connection:
+            version = self.connection.execute(
+                "PRAGMA user_version"
+            ).fetchone()[0]
+            if version != CATALOG_FORMAT:
+                logger.debug(f"Catalog format is {version}, recreating")
+                for table in ("dependencies", "module_versions", "modules",
+                              "versions", "bundles"):
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self.connection.execute(
+                    f"PRAGMA user_version = {CATALOG_FORMAT}"
+                )
+            self.connection.executescript(SCHEMA)
+
+    def add_bundle(self, bundle: Bundle):
+        """
+        Add a bundle to the catalog, replacing it if it is already in there.
+
+        :param bundle: The Bundle to add. Only its metadata is used, none of
+         its versions are loaded.
+        """
+        logger.debug(f"Adding {bundle.path} to catalog")
+        key = dumps(IndexManager.make_key(bundle.path))
+        stems, is_package, pypi_name, version, repo, dependencies = \
+            bundle.module_table.to_arrays()
+        with self.lock, self.connection:
+            db = self.connection
+            db.execute("DELETE FROM bundles WHERE path = ?",
+                       (str(bundle.path),))
+            bundle_id = db.execute(
+                "INSERT INTO bundles (path, key, title, tag_name, url, "
+                "released) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(bundle.path), key, bundle.title, bundle.tag_name,
+                 bundle.url, bundle.released.timestamp())
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO versions (bundle_id, name, path) "
+                "VALUES (?, ?, ?)",
+                [(bundle_id, version, str(bundle.version_paths[version]))
+                 for version in bundle.versions]
+            )
+            db.executemany("INSERT OR IGNORE INTO modules (stem) VALUES (?)",
+                           [(stem,) for stem in stems])
+            module_ids = self.module_ids(stems)
+            module_version_ids = []
+            for i, stem in enumerate(stems):
+                module_version_ids.append(db.execute(
+                    "INSERT INTO module_versions (bundle_id, module_id, "
+                    "version, pypi_name, repo, is_package) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (bundle_id, module_ids[stem], version[i], pypi_name[i],
+                     repo[i],
+                     None if is_package[i] is None else int(is_package[i]))
+                ).lastrowid)
+            db.executemany(
+                "INSERT OR IGNORE INTO dependencies (module_version_id, "
+                "depends_on) VALUES (?, ?)",
+                [(module_version_ids[i], module_ids[stems[dependency]])
+                 for i, ids in enumerate(dependencies)
+                 for dependency in ids]
+            )
+
+    def module_ids(self, stems: Iterable[str]) -> dict[str, int]:
+        """
+        Look up the ids of modules in the modules table. Must be called while
+        holding self.lock.
+
+        :param stems: The names of the modules without any file extension.
+        :return: A dictionary of stems to ids.
+        """
+        ids = {}
+        stems = list(stems)
+        # SQLite limits how many parameters a query can have
+        for start in range(0, len(stems), 500):
+            chunk = stems[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.connection.execute(
+                    f"SELECT id, stem FROM modules "
+                    f"WHERE stem IN ({placeholders})", chunk):
+                ids[row["stem"]] = row["id"]
+        return ids
+
+    def remove_bundle(self, path: Path):
+        """
+        Remove a bundle from the catalog.
+
+        :param path: The path to the bundle.
+        """
+        logger.debug(f"Removing {path} from catalog")
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM bundles WHERE path = ?",
+                                    (str(path),))
+
+    def sync(self, bundles: Iterable[Bundle]):
+        """
+        Bring the catalog up to date with a list of bundles, adding new or
+        changed ones and removing ones that aren't in the list.
+
+        :param bundles: Every bundle that exists right now.
+        """
+        with self.lock:
+            known = {row["path"]: row["key"] for row in self.connection.execute(
+                "SELECT path, key FROM bundles"
+            )}
+        paths = set()
+        for bundle in bundles:
+            paths.add(str(bundle.path))
+            try:
+                key = dumps(IndexManager.make_key(bundle.path))
+            except FileNotFoundError:
+                continue
+            if known.get(str(bundle.path)) != key:
+                self.add_bundle(bundle)
+        for path in known.keys() - paths:
+            self.remove_bundle(Path(path))
+
+    def bundles(self) -> list[sqlite3.Row]:
+        """
+        Get every bundle in the catalog.
+
+        :return: A list of rows with the path, title, tag_name, url and
+         released columns, newest release first.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT path, title, tag_name, url, released FROM bundles "
+                "ORDER BY released DESC"
+            ).fetchall()
+
+    def find_module(self, stem: str,
+                    version_prefix: Union[str, None] = None) -> list[sqlite3.Row]:
+        """
+        Find which bundles contain a module.
+
+        :param stem: The name of the module without any file extension, like
+         "adafruit_display_text".
+        :param version_prefix: Only match module versions starting with this,
+         like "2." for any 2.x version. If None, match every version.
+        :return: A list of rows with the bundle path, title, tag_name and
+         released columns and the module version, pypi_name and repo columns,
+         newest bundle first.
+        """
+        query = ("SELECT b.path, b.title, b.tag_name, b.released, "
+                 "mv.version, mv.pypi_name, mv.repo "
+                 "FROM module_versions mv "
+                 "JOIN modules m ON m.id = mv.module_id "
+                 "JOIN bundles b ON b.id = mv.bundle_id "
+                 "WHERE m.stem = ?")
+        parameters = [stem]
+        if version_prefix is not None:
+            query += " AND mv.version >= ? AND mv.version < ?"
+            parameters += [version_prefix, version_prefix + "\uffff"]
+        query += " ORDER BY b.released DESC"
+        with self.lock:
+            return self.connection.execute(query, parameters).fetchall()
+
+    def find_pypi_name(self, pypi_name: str) -> list[sqlite3.Row]:
+        """
+        Find which bundles contain a module by its PyPI name.
+
+        :param pypi_name: The PyPI name, like
+         "adafruit-circuitpython-display-text".
+        :return: A list of rows like CatalogManager.find_module() and a stem
+         column.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT b.path, b.title, b.tag_name, b.released, m.stem, "
+                "mv.version, mv.pypi_name, mv.repo "
+                "FROM module_versions mv "
+                "JOIN modules m ON m.id = mv.module_id "
+                "JOIN bundles b ON b.id = mv.bundle_id "
+                "WHERE mv.pypi_name = ? ORDER BY b.released DESC",
+                (pypi_name,)
+            ).fetchall()
+
+    def dependencies(self, stem: str, bundle_path: Path) -> list[str]:
+        """
+        Get the modules a module directly depends on in a bundle.
+
+        :param stem: The name of the module without any file extension.
+        :param bundle_path: The path to the bundle.
+        :return: A sorted list of stems.
+        """
+        with self.lock:
+            return [row["stem"] for row in self.connection.execute(
+                "SELECT d_m.stem FROM dependencies d "
+                "JOIN module_versions mv ON mv.id = d.module_version_id "
+                "JOIN modules m ON m.id = mv.module_id "
+                "JOIN bundles b ON b.id = mv.bundle_id "
+                "JOIN modules d_m ON d_m.id = d.depends_on "
+                "WHERE m.stem = ? AND b.path = ? ORDER BY d_m.stem",
+                (stem, str(bundle_path))
+            )]
+
+    def dependents(self, stem: str, bundle_path: Path) -> list[str]:
+        """
+        Get the modules that directly depend on a module in a bundle.
+
+        :param stem: The name of the module without any file extension.
+        :param bundle_path: The path to the bundle.
+        :return: A sorted list of stems.
+        """
+        with self.lock:
+            return [row["stem"] for row in self.connection.execute(
+                "SELECT m.stem FROM dependencies d "
+                "JOIN module_versions mv ON mv.id = d.module_version_id "
+                "JOIN modules m ON m.id = mv.module_id "
+                "JOIN bundles b ON b.id = mv.bundle_id "
+                "JOIN modules d_m ON d_m.id = d.depends_on "
+                "WHERE d_m.stem = ? AND b.path = ? ORDER BY m.stem",
+                (stem, str(bundle_path))
+            )]
+
+    def bundles_with_version(self, version: str) -> list[sqlite3.Row]:
+        """
+        Find which bundles have a version, like "7.x-mpy".
+
+        :param version: The name of the version.
+        :return: A list of rows with the bundle path, title, tag_name and
+         released columns, newest bundle first.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT b.path, b.title, b.tag_name, b.released "
+                "FROM versions v JOIN bundles b ON b.id = v.bundle_id "
+                "WHERE v.name = ? ORDER BY b.released DESC",
+                (version,)
+            ).fetchall()
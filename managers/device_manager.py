@@ -22,10 +22,11 @@ import logging
 from shutil import disk_usage, copy2, copytree, rmtree
 from pathlib import Path
 from string import ascii_uppercase
-from typing import Union
+from typing import Callable, Union
 
 from helpers.create_logger import create_logger
 from helpers.operating_system import on_windows
+from helpers.progress import byte_progress, finish_progress
 from helpers.singleton import Singleton
 from managers.bundle_manager import Module
 from helpers.file_size import get_size, ByteSize
@@ -63,12 +64,19 @@ class Drive:
         self.used_size = ByteSize(self.used_size)
         self.free_size = ByteSize(self.free_size)
 
-    def install_module(self, module: Module):
+    def install_module(self, module: Module,
+                       pb_func: Callable = lambda got, total, status: None,
+                       dependencies: bool = False) -> list[Module]:
         """
         Install the module to this device. Will raise NotImplementedError if
         this is not a CircuitPython drive.
 
         :param module: The module to install.
+        :param pb_func: A function to call to update GUIs, etc. Will be passed
+         2 integers and a string positionally with the first being how far,
+         the second being the total, and the third being a status bar.
+        :param dependencies: Whether to install missing dependencies too.
+        :return: The dependencies that were installed.
         """
         raise NotImplementedError
 
@@ -140,18 +148,78 @@ class CircuitPythonDrive(Drive):
         else:
             logger.warning(f"Unable to find {lib_path}!")
 
-    def install_module(self, module: Module):
+    def missing_dependencies(self, module: Module) -> list[Module]:
         """
-        Install the module to this device. Will raise NotImplementedError if
-        this is not a CircuitPython drive.
+        Get the modules a module depends on, directly or indirectly, that are
+        not installed in lib yet.
+
+        :param module: The module to check.
+        :return: A list of Modules from the same bundle version.
+        """
+        installed = {Path(name).stem for name in self.installed_modules}
+        missing = []
+        for dependency in module.graph.transitive_dependencies(module.stem):
+            if dependency.stem in installed:
+                continue
+            if not dependency.path.exists():
+                logger.warning(f"Dependency {dependency.stem} of "
+                               f"{module.stem} is not in the bundle, "
+                               f"skipping")
+                continue
+            missing.append(dependency)
+        return missing
+
+    def install_module(self, module: Module,
+                       pb_func: Callable = lambda got, total, status: None,
+                       dependencies: bool = False) -> list[Module]:
+        """
+        Install the module to this device, along with any modules it depends
+        on that aren't installed yet.
 
         :param module: The module to install.
+        :param pb_func: A function to call to update GUIs, etc. Will be passed
+         2 integers and a string positionally with the first being how far,
+         the second being the total, and the third being a status bar. Called
+         after every file is copied.
+        :param dependencies: Whether to install missing dependencies too.
+        :return: The dependencies that were installed.
         """
         logger.debug(f"Installing module {module} ({module.name})")
-        if module.path.is_file():
-            copy2(module.path, self.lib_path)
-        else:
-            copytree(module.path, self.lib_path / module.path.name)
+        missing = self.missing_dependencies(module) if dependencies else []
+        if len(missing) > 0:
+            logger.debug(f"Also installing dependencies "
+                         f"{[dependency.name for dependency in missing]}")
+        report = byte_progress(pb_func)
+        status = f"Copying {module.name}"
+        if len(missing) > 0:
+            status += f" and {len(missing)} " \
+                      f"{'dependency' if len(missing) == 1 else 'dependencies'}"
+        sources = []
+        for target in [module] + missing:
+            if target.path.is_file():
+                sources.append(target.path)
+            else:
+                sources.extend(path for path in target.path.rglob("*")
+                               if path.is_file())
+        total = sum(path.stat().st_size for path in sources)
+        copied = 0
+        report(copied, total, status)
+
+        def copy_and_report(source: str, destination: str) -> str:
+            nonlocal copied
+            destination = copy2(source, destination)
+            copied += Path(source).stat().st_size
+            report(copied, total, status)
+            return destination
+
+        for target in [module] + missing:
+            if target.path.is_file():
+                copy_and_report(target.path, self.lib_path)
+            else:
+                copytree(target.path, self.lib_path / target.path.name,
+                         copy_function=copy_and_report)
+        finish_progress(pb_func)
+        return missing
 
     def uninstall_module(self, module: str):
         """
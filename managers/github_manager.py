@@ -19,28 +19,190 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
-from io import BytesIO
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from json import dumps, loads
 from pathlib import Path
-from typing import Callable
-from zipfile import ZipFile
+from threading import Lock
+from time import sleep
+from typing import Callable, Iterable, Union
+from zipfile import ZipFile, ZipInfo
 
 import requests
-from github import Github
-from github.GitRelease import GitRelease
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError
+from urllib3.util.retry import Retry
 
 from helpers.create_logger import create_logger
-from helpers.file_size import ByteSize
+from helpers.github_api import GitHubAPI, Release, RequestScheduler, \
+    ResponseCache
+from helpers.progress import byte_progress, finish_progress
 from helpers.sanitizers import filename_sanitize, directory_sanitize
+from managers.asset_cache_manager import AssetCacheManager
+from managers.bundle_manager import Bundle, MANIFEST_NAME, METADATA_NAME, \
+    SIDECAR_NAME, make_record, read_manifest, write_manifest, \
+    write_metadata_sidecar
+from managers.catalog_manager import CatalogManager
+from managers.object_manager import ObjectManager
+from managers.partial_manager import PartialManager
+from managers.staging_manager import StagingManager
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
-github_instance = None
+# Seconds to wait before the first retry, doubling after each one
+DOWNLOAD_BACKOFF = 0.5
+# Seconds to wait for the server to connect or send more data
+DOWNLOAD_TIMEOUT = 30
+
+ASSET_PREFIXES = ("adafruit-circuitpython-bundle-",
+                  "circuitpython-community-bundle-")
+EXAMPLES_NAME = "examples"
+
+
+def asset_version(name: str, tag_name: str) -> Union[str, None]:
+    """
+    Get which variant of a bundle a release asset is, like "py", "7.x-mpy" or
+    "examples".
+
+    :param name: The name of the asset.
+    :param tag_name: The tag name of the release.
+    :return: A string, or None if the asset isn't a ZIP of a bundle variant.
+     (like the JSON dependencies file)
+    """
+    suffix = f"-{tag_name}.zip"
+    if not name.endswith(suffix):
+        return None
+    name = name[:-len(suffix)]
+    for prefix in ASSET_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return None
+
+
+def is_example_member(name: str) -> bool:
+    """
+    Get whether a member of a bundle ZIP is part of the examples, which every
+    variant ships a copy of next to lib/.
+
+    :param name: The name of the ZIP member.
+    :return: A bool.
+    """
+    parts = name.split("/")
+    return len(parts) > 1 and parts[1] == EXAMPLES_NAME
+
+
+def unchanged_modules(previous: Bundle, dependencies: dict) -> set[str]:
+    """
+    Get which modules have the same version in a bundle that is already
+    downloaded and in a release's dependency data.
+
+    :param previous: The Bundle that is already downloaded.
+    :param dependencies: The contents of the release's dependencies JSON
+     file.
+    :return: A set of module stems, like "adafruit_bus_device".
+    """
+    table = previous.module_table
+    unchanged = set()
+    for stem, info in dependencies.items():
+        version = info.get("version")
+        if version is not None and stem in table.ids and \
+                table.version[table.ids[stem]] == version:
+            unchanged.add(stem)
+    return unchanged
+
+
+def file_crc(path: Path) -> int:
+    """
+    Compute the CRC-32 of a file, like the one a ZIP file stores for each
+    member.
+
+    :param path: The path to the file.
+    :return: An integer.
+    """
+    crc = 0
+    with path.open("rb") as file:
+        while True:
+            chunk = file.read(1024 * 64)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def previous_file_finder(previous_root: Path, unchanged: set[str],
+                         manifest: Union[dict[str, tuple[str, int]],
+                                         None] = None) -> \
+        Callable[[ZipInfo], Union[tuple[Path, Union[str, None]], None]]:
+    """
+    Make a function for ObjectManager.extract's reuse parameter, which finds
+    the files of unchanged modules in a variant of a bundle that is already
+    downloaded. A module's version can stay the same while its files change
+    (like when a bundle is rebuilt with a new mpy-cross), so a file is only
+    reused if its CRC-32 matches the one in the ZIP file.
+
+    :param previous_root: The path to the variant in the downloaded bundle,
+     like ".../adafruit-circuitpython-bundle-7.x-mpy-20211010".
+    :param unchanged: The stems of the modules that didn't change. (See
+     unchanged_modules)
+    :param manifest: The manifest of the downloaded bundle, to take the
+     digests of reused files from, or None if it has no manifest.
+    :return: A function that is passed a ZIP member and returns a tuple of
+     the path to the same file in the downloaded bundle and its digest (or
+     None), or None.
+    """
+    def find(member: ZipInfo) -> Union[tuple[Path, Union[str, None]], None]:
+        parts = member.filename.split("/")
+        if len(parts) < 3 or parts[1] != "lib" or \
+                Path(parts[2]).stem not in unchanged:
+            return None
+        source = previous_root.joinpath(*parts[1:])
+        try:
+            if not source.is_file() or \
+                    source.stat().st_size != member.file_size or \
+                    file_crc(source) != member.CRC:
+                return None
+        except OSError:
+            return None
+        digest = None
+        if manifest is not None:
+            name = "/".join([previous_root.name] + parts[1:])
+            digest, _ = manifest.get(name, (None, None))
+        return source, digest
+
+    return find
+
+
+def make_session(pool_size: int, retries: int) -> requests.Session:
+    """
+    Make a requests Session that keeps connections alive and retries failed
+    connections and error statuses with an exponential backoff.
+
+    :param pool_size: How many connections to keep open per host.
+    :param retries: How many times to retry.
+    :return: A requests Session.
+    """
+    retry = Retry(total=retries, backoff_factor=DOWNLOAD_BACKOFF,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET", "HEAD"), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class GitHubManager:
     def __init__(self, token: str, bundle_repo: str, bundle_path: Path,
-                 is_community: bool = False):
+                 is_community: bool = False,
+                 catalog: Union[CatalogManager, None] = None,
+                 workers: int = 1, retries: int = 0,
+                 asset_cache: Union[AssetCacheManager, None] = None,
+                 api_cache: Union[ResponseCache, None] = None,
+                 extract_workers: int = 1,
+                 api_scheduler: Union[RequestScheduler, None] = None,
+                 graphql: bool = False):
         """
         Make a GitHub manager.
 
@@ -49,33 +211,147 @@ class GitHubManager:
         :param bundle_path: The path to where bundles are stored.
         :param is_community: A bool on whether this repo is the community
          bundle or not.
+        :param catalog: A CatalogManager to add downloaded bundles to, or None.
+        :param workers: How many assets of a release to download at once.
+        :param retries: How many times to retry a failed download.
+        :param asset_cache: An AssetCacheManager to look for assets in before
+         downloading them and to keep downloaded assets in, or None.
+        :param api_cache: A ResponseCache to keep GitHub API responses in, or
+         None to only keep them in memory.
+        :param extract_workers: How many files of a ZIP file to extract at
+         once.
+        :param api_scheduler: A RequestScheduler to send GitHub API requests
+         through, or None to make one. Share one between managers so they
+         all know how much of the rate limit is left.
+        :param graphql: Whether to list releases with the GraphQL API instead
+         of the REST API. See GitHubAPI.get_releases for the trade-off.
         """
         self.token = token
         self.bundle_repo = bundle_repo
         self.bundle_path = bundle_path
         self.is_community = is_community
-        global github_instance
-        if github_instance is None:
-            logger.debug("Authenticating with GitHub")
-            self.github = Github(token)
-            github_instance = self.github
-        else:
-            logger.debug(f"Using existing authenticated GitHub object")
-            self.github = github_instance
-        logger.debug("Getting repo...")
-        self.repo = self.github.get_repo(self.bundle_repo)
-        logger.debug("Getting releases...")
-        self.release_pag = self.repo.get_releases()
-        self.max_page = int(self.release_pag._getLastPageUrl().split("?page=")[1])
-
-    def download_release(self, release: GitRelease, pb_func: Callable):
+        self.catalog = catalog
+        self.objects = ObjectManager(self.bundle_path)
+        self.partials = PartialManager(self.bundle_path)
+        self.partials.clean()
+        self.staging = StagingManager(self.bundle_path)
+        self.workers = workers
+        self.retries = retries
+        self.asset_cache = asset_cache
+        self.extract_workers = extract_workers
+        self.session = make_session(workers, retries)
+        if api_cache is None:
+            api_cache = ResponseCache()
+        self.api = GitHubAPI(token, api_cache, self.session, api_scheduler)
+        self.release_pag = self.api.get_releases(self.bundle_repo, graphql)
+
+    def download_file(self, url: str, expected_length: Union[int, None],
+                      progress: Callable[[int], None]) -> Path:
+        """
+        Download a file over the shared session into the partial download
+        store. Connection errors and error statuses are retried by the
+        session itself, while a download that breaks partway through is
+        resumed with a Range request after a backoff. A partial download left
+        over from an earlier attempt is resumed too, as long as the server
+        still has the same file. (checked with If-Range and the ETag)
+
+        :param url: The URL to download.
+        :param expected_length: How long the file should be, or None if
+         unknown.
+        :param progress: A function to call with how many more bytes were
+         downloaded. (Negative if a failed attempt is thrown away)
+        :return: The path to the finished download. Call
+         self.partials.discard(url) when done with it. Must be called while
+         holding self.partials.claim(url) until then.
+        """
+        data_path = self.partials.data_path(url)
+        for attempt in range(self.retries + 1):
+            have, length, etag = self.partials.get(url)
+            if have > 0 and expected_length is not None and \
+                    length != expected_length:
+                logger.debug(f"Partial download of {url} is for a different "
+                             f"file, starting over")
+                self.partials.discard(url)
+                have, length, etag = 0, None, None
+            headers = {}
+            if have > 0:
+                headers["Range"] = f"bytes={have}-"
+                if etag is not None:
+                    headers["If-Range"] = etag
+            got = 0
+            try:
+                logger.debug(f"Downloading {url}")
+                with self.session.get(url, stream=True, headers=headers,
+                                      timeout=DOWNLOAD_TIMEOUT) as response:
+                    if response.status_code == 416:
+                        if have == length:
+                            logger.debug(f"{url} was already downloaded")
+                            progress(have)
+                            return data_path
+                        self.partials.discard(url)
+                        raise requests.ConnectionError(
+                            f"Server refused to resume {url}"
+                        )
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        logger.debug(f"Resuming {url} from byte {have}")
+                        mode = "ab"
+                        got = have
+                    else:
+                        mode = "wb"
+                        length = expected_length
+                        if "Content-Length" in response.headers:
+                            length = int(response.headers["Content-Length"])
+                        self.partials.start(url, length,
+                                            response.headers.get("ETag"))
+                    progress(got)
+                    with data_path.open(mode) as file:
+                        for chunk in response.iter_content(
+                                chunk_size=1024 * 64):
+                            file.write(chunk)
+                            got += len(chunk)
+                            progress(len(chunk))
+                if length is not None and got > length:
+                    self.partials.discard(url)
+                    raise ValueError(f"Downloaded {got} bytes of {url} but "
+                                     f"expected {length} bytes")
+                if length is not None and got < length:
+                    raise requests.ConnectionError(
+                        f"Download of {url} ended after {got} of {length} "
+                        f"bytes"
+                    )
+                return data_path
+            except (requests.ConnectionError, requests.Timeout,
+                    ChunkedEncodingError) as e:
+                progress(-got)
+                if attempt == self.retries:
+                    raise
+                delay = DOWNLOAD_BACKOFF * 2 ** attempt
+                logger.warning(f"Error downloading {url}, retrying in "
+                               f"{delay}s: {e}")
+                sleep(delay)
+
+    def download_release(self, release: Release, pb_func: Callable,
+                         versions: Union[Iterable[str], None] = None,
+                         include_examples: bool = True,
+                         previous: Union[Bundle, None] = None):
         """
         Download a release into the bundle folder.
 
-        :param release: A GitRelease to download from.
+        :param release: A Release to download from.
         :param pb_func: A function to call to update GUIs, etc. Will be passed
          2 integers and a string positionally with the first being how far,
-         the second being the total, and the third being a status bar.
+         the second being the total, and the third being a status bar. Pass a
+         ProgressReporter to throttle updates and show the download speed.
+        :param versions: The variants of the bundle to download, like
+         ["py", "7.x-mpy"], or None to download all of them. (See
+         asset_version) Assets that aren't a bundle variant are always
+         downloaded.
+        :param include_examples: Whether to download the examples ZIP and
+         extract the examples in each variant.
+        :param previous: A Bundle from an older release of the same repo to
+         upgrade from, or None. Modules whose version is the same in both
+         releases are linked or copied from it instead of being extracted.
         """
         # To test, I used this code: (Make sure you have GitHub token stored in
         # CredentialManager!)
@@ -105,59 +381,172 @@ class GitHubManager:
             release.title + (" (community)" if self.is_community else "")
         )
         logger.debug(f"Path to new bundle is {path}")
-        path.mkdir()
+        if path.exists():
+            raise FileExistsError(f"{path} already exists")
+        if versions is not None:
+            versions = set(versions)
+        wanted = []
         for asset in assets:
-            url = asset.browser_download_url
-            logger.debug(f"Downloading {url}")
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            total = int(response.headers["Content-Length"].strip())
-            got = 0
-            if url.endswith(".zip"):
-                zip_data = BytesIO()
-                for chunk in response.iter_content(chunk_size=1024 * 64):
-                    got += len(chunk)
-                    status = f"Downloading ZIP file - " \
-                             f"{str(ByteSize(got))} / " \
-                             f"{str(ByteSize(total))}"
-                    pb_func(got, total, status)
-                    zip_data.write(chunk)
-                logger.debug(f"Extracting zip file")
-                pb_func(1, 1, f"Extracting ZIP file...")
-                with ZipFile(zip_data) as zip_f:
-                    zip_f.extractall(path)
-            elif url.endswith(".json"):
-                file_path = path / filename_sanitize(url.split("/")[-1])
-                status = f"Downloading JSON file (" \
-                         f"{str(ByteSize(total))})"
-                pb_func(1, 1, status)
-                file_path.write_bytes(response.content)
-            else:
-                file_path = path / filename_sanitize(url.split("/")[-1])
-                for chunk in response.iter_content(chunk_size=1024):
-                    got += len(chunk)
-                    status = f"Downloading file - " \
-                             f"{str(ByteSize(got))} / " \
-                             f"{str(ByteSize(total))}"
-                    pb_func(got, total, status)
-                    file_path.write_bytes(chunk)
-        bundles = []
-        dependencies = {}
-        total = len(list(path.glob("*")))
-        for index, thing in enumerate(path.glob("*")):
-            logger.debug(f"Scanning {thing}")
-            pb_func(index + 1, total, f"Scanning downloaded content... "
-                                      f"({index + 1} / {total})")
-            if "mpy" in thing.name or "py" in thing.name and \
-                    "examples" not in thing.name and thing.is_dir():
-                logger.debug(f"Found bundle: {thing}")
-                bundles.append(str(thing))
-            if "json" in thing.name and thing.is_file():
-                logger.debug(f"Found dependencies file: {thing}")
-                dependencies = loads(thing.read_text())
-        bundle_metadata["bundles"] = bundles
-        bundle_metadata["dependencies"] = dependencies
-        metadata_path = path / "metadata.json"
-        logger.debug(f"Writing metadata to {metadata_path}")
-        pb_func(1, 1, "Writing metadata...")
-        metadata_path.write_text(dumps(bundle_metadata, indent=2))
+            version = asset_version(asset.name, release.tag_name)
+            if version == EXAMPLES_NAME and not include_examples or \
+                    version not in (None, EXAMPLES_NAME) and \
+                    versions is not None and version not in versions:
+                logger.debug(f"Skipping {asset.name}")
+                continue
+            wanted.append(asset)
+        total = sum(asset.size for asset in wanted)
+        got = 0
+        progress_lock = Lock()
+        report = byte_progress(pb_func)
+        status = f"Downloading {len(wanted)} files"
+
+        def progress(amount: int):
+            nonlocal got
+            with progress_lock:
+                got += amount
+                report(got, total, status)
+
+        # Own the partial downloads of every asset until they have been
+        # extracted, so another download of the same assets waits for this
+        # one instead of writing to the same files. Claimed in sorted order so
+        # 2 downloads can't each hold what the other is waiting for. Cached
+        # assets are pinned until then too, and the cache is only trimmed
+        # once everything has been let go of.
+        with ExitStack() as cleanup:
+            if self.asset_cache is not None:
+                cleanup.callback(self.asset_cache.trim)
+            for url in sorted(asset.browser_download_url for asset in wanted):
+                cleanup.enter_context(self.partials.claim(url))
+            # Another download of this release may have finished while the
+            # claims were being waited for
+            if path.exists():
+                raise FileExistsError(f"{path} already exists")
+            cached = {}
+            if self.asset_cache is not None:
+                for asset in wanted:
+                    cached_path = self.asset_cache.get(asset, pin=True)
+                    if cached_path is not None:
+                        cleanup.callback(self.asset_cache.unpin, cached_path)
+                        cached[asset.browser_download_url] = cached_path
+                        progress(asset.size)
+            to_download = [asset for asset in wanted
+                           if asset.browser_download_url not in cached]
+            logger.debug(f"Downloading {len(to_download)} files with "
+                         f"{self.workers} threads, {len(cached)} files are "
+                         f"cached")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {asset.browser_download_url:
+                           executor.submit(self.download_file,
+                                           asset.browser_download_url,
+                                           asset.size, progress)
+                           for asset in to_download}
+                downloaded = {url: future.result()
+                              for url, future in futures.items()}
+            finish_progress(pb_func)
+            downloads = {}
+            for asset in wanted:
+                url = asset.browser_download_url
+                if url in cached:
+                    downloads[url] = cached[url]
+                elif self.asset_cache is not None:
+                    downloads[url] = self.asset_cache.put(asset,
+                                                          downloaded[url],
+                                                          pin=True)
+                    cleanup.callback(self.asset_cache.unpin, downloads[url])
+                    self.partials.discard(url)
+                else:
+                    downloads[url] = downloaded[url]
+            unchanged = set()
+            if previous is not None:
+                for url, data_path in downloads.items():
+                    if url.endswith(".json"):
+                        unchanged = unchanged_modules(
+                            previous, loads(Path(data_path).read_text())
+                        )
+                logger.debug(f"{len(unchanged)} modules are unchanged since "
+                             f"{previous.title}")
+            versions_by_url = {asset.browser_download_url:
+                               asset_version(asset.name, release.tag_name)
+                               for asset in wanted}
+            previous_manifest = None
+            if previous is not None:
+                previous_manifest = read_manifest(previous.path /
+                                                  MANIFEST_NAME)
+            files = {}
+            bundles = []
+            dependencies = {}
+            # Everything is written to a staging directory first and moved
+            # into place once it is complete, so a crash or another download
+            # of the same release never leaves a half-written bundle to be
+            # indexed.
+            staged = self.staging.create()
+            try:
+                for url, data_path in downloads.items():
+                    if url.endswith(".zip"):
+                        # The ZIP's central directory is at the end of the
+                        # file, so extraction has to wait for the whole
+                        # download.
+                        logger.debug(f"Extracting {url}")
+                        pb_func(1, 1, f"Extracting ZIP file...")
+                        with ZipFile(data_path) as zip_f:
+                            members = None
+                            if not include_examples:
+                                members = [
+                                    m for m in zip_f.infolist()
+                                    if not is_example_member(m.filename)
+                                ]
+                            reuse = None
+                            previous_root = None
+                            if previous is not None:
+                                previous_root = previous.version_paths.get(
+                                    versions_by_url[url]
+                                )
+                            if previous_root is not None and \
+                                    len(unchanged) > 0:
+                                reuse = previous_file_finder(previous_root,
+                                                             unchanged,
+                                                             previous_manifest)
+                            extracted = self.objects.extract(
+                                zip_f, staged, pb_func, members,
+                                self.extract_workers, reuse
+                            )
+                        files.update(extracted)
+                        if versions_by_url[url] not in (None, EXAMPLES_NAME):
+                            roots = {name.split("/")[0] for name in extracted}
+                            logger.debug(f"Found bundles: {roots}")
+                            bundles.extend(str(path / root)
+                                           for root in sorted(roots))
+                        self.partials.discard(url)
+                    else:
+                        name = filename_sanitize(url.split("/")[-1])
+                        file_path = staged / name
+                        with self.objects.in_use(), \
+                                open(data_path, "rb") as source:
+                            digest, size, _ = self.objects.place(
+                                source, file_path,
+                                Path(data_path).stat().st_size
+                            )
+                        files[name] = (digest, size)
+                        if name.endswith(".json"):
+                            logger.debug(f"Found dependencies file: "
+                                         f"{file_path}")
+                            dependencies = loads(file_path.read_text())
+                        self.partials.discard(url)
+                bundle_metadata["bundles"] = bundles
+                bundle_metadata["dependencies"] = dependencies
+                metadata_path = staged / METADATA_NAME
+                logger.debug(f"Writing metadata to {metadata_path}")
+                pb_func(1, 1, "Writing metadata...")
+                write_manifest(staged / MANIFEST_NAME, files)
+                metadata_path.write_text(dumps(bundle_metadata, indent=2))
+                write_metadata_sidecar(staged / SIDECAR_NAME,
+                                       make_record(bundle_metadata))
+                self.staging.publish(staged, path)
+            except Exception:
+                logger.exception(f"Error while staging {path} in {staged}, "
+                                 f"removing it")
+                self.staging.discard(staged)
+                raise
+        if self.catalog is not None:
+            pb_func(1, 1, "Adding to catalog...")
+            self.catalog.add_bundle(Bundle(path))
@@ -0,0 +1,150 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from json import dumps, loads, JSONDecodeError
+from pathlib import Path
+from typing import Iterable, Union
+
+from helpers.create_logger import create_logger
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+INDEX_FORMAT = 4
+
+
+class IndexManager:
+    def __init__(self, index_path: Path):
+        """
+        Make an IndexManager, which remembers what every bundle looked like
+        the last time it was scanned so unchanged bundles don't need to be
+        scanned again.
+
+        :param index_path: The path to the JSON file where the index is
+         stored.
+        """
+        self.path = index_path
+        self.entries = {}
+        self.dirty = False
+        self.load_from_disk()
+
+    def load_from_disk(self):
+        """
+        Reload the index from the disk. A missing, corrupt or outdated index
+        is treated as empty.
+        """
+        logger.debug(f"Loading index from {self.path}")
+        self.entries = {}
+        self.dirty = False
+        if not self.path.exists():
+            return
+        try:
+            index = loads(self.path.read_text())
+        except (OSError, JSONDecodeError):
+            logger.exception(f"Unable to read index at {self.path}, ignoring")
+            return
+        if index.get("format") != INDEX_FORMAT:
+            logger.debug("Index is from a different format, ignoring")
+            return
+        self.entries = index["bundles"]
+
+    def save_to_disk(self):
+        """
+        Save the index to the disk if anything has changed.
+        """
+        if not self.dirty:
+            return
+        logger.debug(f"Saving index to {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(dumps({"format": INDEX_FORMAT,
+                                    "bundles": self.entries}))
+        self.dirty = False
+
+    @staticmethod
+    def make_key(path: Path) -> list:
+        """
+        Make the key that decides whether a cached bundle is still valid.
+
+        :param path: The path to the bundle.
+        :return: A list with the resolved path, the modification time of the
+         bundle directory and the size of its metadata.json file.
+        """
+        return [str(path.resolve()), path.stat().st_mtime_ns,
+                (path / "metadata.json").stat().st_size]
+
+    def get(self, path: Path) -> Union[dict, None]:
+        """
+        Get the cached data for a bundle.
+
+        :param path: The path to the bundle.
+        :return: A dictionary, or None if the bundle isn't cached or has
+         changed since it was cached.
+        """
+        entry = self.entries.get(str(path))
+        if entry is None:
+            return None
+        try:
+            key = self.make_key(path)
+        except FileNotFoundError:
+            return None
+        if entry["key"] != key:
+            logger.debug(f"Cached index for {path} is stale")
+            return None
+        return entry["data"]
+
+    def put(self, path: Path, data: dict):
+        """
+        Cache the data for a bundle.
+
+        :param path: The path to the bundle.
+        :param data: A JSON-serializable dictionary.
+        """
+        self.entries[str(path)] = {"key": self.make_key(path), "data": data}
+        self.dirty = True
+
+    def invalidate(self, path: Union[Path, None] = None):
+        """
+        Forget about a bundle, so it will be scanned again on the next index.
+
+        :param path: The path to the bundle. If None, forget about every
+         bundle.
+        """
+        if path is None:
+            logger.debug("Invalidating entire index")
+            if len(self.entries) > 0:
+                self.entries = {}
+                self.dirty = True
+        elif str(path) in self.entries:
+            logger.debug(f"Invalidating index for {path}")
+            del self.entries[str(path)]
+            self.dirty = True
+
+    def prune(self, paths: Iterable[Path]):
+        """
+        Forget about every bundle that isn't in the given paths.
+
+        :param paths: The paths of the bundles that still exist.
+        """
+        keep = {str(path) for path in paths}
+        for path in list(self.entries.keys()):
+            if path not in keep:
+                logger.debug(f"Pruning {path} from index")
+                del self.entries[path]
+                self.dirty = True
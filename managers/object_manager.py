@@ -0,0 +1,486 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from shutil import copy2
+from tempfile import NamedTemporaryFile
+from threading import Condition, Lock, local
+from typing import BinaryIO, Callable, Iterable, Iterator, Union
+from zipfile import ZipFile, ZipInfo
+
+from helpers.create_logger import create_logger
+from helpers.operating_system import default_mode
+from helpers.progress import count_progress, finish_progress
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+OBJECTS_DIR = ".objects"
+HASH_NAME = "sha256"
+CHUNK_SIZE = 1024 * 64
+# Files up to this size are read into memory and hashed before anything is
+# written, so files that are already stored cost no writes at all
+BUFFER_LIMIT = 1024 * 1024 * 4
+
+
+class StoreGuard:
+    def __init__(self):
+        """
+        Make a StoreGuard, which keeps garbage collection of an object store
+        from running while anything is being stored in or linked from it.
+        There is one per object store directory, shared by every
+        ObjectManager for that directory.
+        """
+        self.condition = Condition()
+        self.users = 0
+        self.waiting = 0
+        self.collecting = False
+
+
+_guards = {}
+_guards_lock = Lock()
+
+
+def store_guard(path: Path) -> StoreGuard:
+    """
+    Get the StoreGuard of an object store directory.
+
+    :param path: The path to the object store.
+    :return: A StoreGuard.
+    """
+    with _guards_lock:
+        key = os.path.abspath(path)
+        if key not in _guards:
+            _guards[key] = StoreGuard()
+        return _guards[key]
+
+
+def hash_file(path: Path) -> str:
+    """
+    Hash the contents of a file.
+
+    :param path: The path to the file.
+    :return: The hex digest.
+    """
+    hasher = hashlib.new(HASH_NAME)
+    with path.open("rb") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def safe_member_path(dest: Path, name: str) -> Path:
+    """
+    Get where a ZIP member should be extracted to, refusing names that would
+    end up outside of the destination.
+
+    :param dest: The directory the ZIP file is extracted into.
+    :param name: The name of the ZIP member.
+    :return: A Path.
+    """
+    parts = PurePosixPath(name.replace("\\", "/")).parts
+    if len(parts) == 0 or parts[0] == "/" or ".." in parts or \
+            ":" in parts[0]:
+        raise ValueError(f"Refusing to extract unsafe ZIP member {name!r}")
+    return dest.joinpath(*parts)
+
+
+class ObjectManager:
+    def __init__(self, bundle_path: Path):
+        """
+        Make an ObjectManager, which keeps one copy of every file extracted
+        from a bundle under the bundles directory, named by the hash of its
+        contents. Bundles get hard links to those files, so a file that is
+        the same in many releases only takes up space once.
+
+        :param bundle_path: The path to the bundles.
+        """
+        self.bundle_path = bundle_path
+        self.path = bundle_path / OBJECTS_DIR
+        self.guard = store_guard(self.path)
+        self._links_supported = None
+        self._links_lock = Lock()
+
+    def links_supported(self) -> bool:
+        """
+        Check whether files in the object store can be hard linked into the
+        bundles directory. Checked once, by linking a test file. If they
+        can't (like on FAT drives), the store is bypassed and files are
+        written straight to where they belong, as copies of objects would
+        never have more than 1 link and would all be collected as garbage.
+
+        :return: A bool.
+        """
+        with self._links_lock:
+            if self._links_supported is None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                source = self.write_temp((b"", ))
+                dest = self.bundle_path / f".link-test-{os.getpid()}"
+                try:
+                    os.link(source, dest)
+                except OSError as e:
+                    logger.warning(f"Unable to hard link from {self.path} to "
+                                   f"{self.bundle_path} ({e}), files will be "
+                                   f"copied and not deduplicated")
+                    self._links_supported = False
+                else:
+                    os.unlink(dest)
+                    self._links_supported = True
+                finally:
+                    os.unlink(source)
+            return self._links_supported
+
+    @contextmanager
+    def in_use(self) -> Iterator[None]:
+        """
+        Keep garbage collection from running until the block exits. Wrap
+        everything between storing an object and linking to it in this, so
+        the object can't be collected in between. Waits for a collection that
+        is already running to finish.
+        """
+        with self.guard.condition:
+            self.guard.waiting += 1
+            while self.guard.collecting:
+                self.guard.condition.wait()
+            self.guard.waiting -= 1
+            self.guard.users += 1
+        try:
+            yield
+        finally:
+            with self.guard.condition:
+                self.guard.users -= 1
+                self.guard.condition.notify_all()
+
+    def object_path(self, digest: str) -> Path:
+        """
+        Get where the object with a digest is stored.
+
+        :param digest: The hex digest of the contents.
+        :return: A Path.
+        """
+        return self.path / digest[:2] / digest[2:]
+
+    def store(self, source: BinaryIO,
+              size: Union[int, None] = None) -> tuple[str, int, bool]:
+        """
+        Store the contents of a file, unless an object with the same contents
+        is already stored. Should be called inside in_use(), along with
+        linking to the object.
+
+        :param source: A file-like object opened for reading bytes.
+        :param size: How big the file is, if known. Files up to BUFFER_LIMIT
+         bytes are hashed before anything is written, bigger or unknown ones
+         are hashed while they are written to a temporary file.
+        :return: A tuple of the hex digest, the size in bytes and a bool on
+         whether the object was new.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        if size is not None and size <= BUFFER_LIMIT:
+            data = source.read()
+            digest = hashlib.new(HASH_NAME, data).hexdigest()
+            if self.object_path(digest).exists():
+                return digest, len(data), False
+            return digest, len(data), self.add_temp(self.write_temp((data, )),
+                                                    digest)
+        hasher = hashlib.new(HASH_NAME)
+        size = 0
+
+        def chunks() -> Iterator[bytes]:
+            nonlocal size
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+                yield chunk
+
+        temp_path = self.write_temp(chunks())
+        digest = hasher.hexdigest()
+        return digest, size, self.add_temp(temp_path, digest)
+
+    def write_temp(self, chunks: Iterable[bytes]) -> str:
+        """
+        Write data to a new temporary file in the object store.
+
+        :param chunks: An iterable of the bytes to write.
+        :return: The path to the temporary file.
+        """
+        with NamedTemporaryFile(dir=self.path, prefix="tmp-",
+                                delete=False) as temp:
+            try:
+                for chunk in chunks:
+                    temp.write(chunk)
+            except BaseException:
+                temp.close()
+                os.unlink(temp.name)
+                raise
+        # Temporary files are only readable by us, but objects are linked
+        # into bundles and copied to devices like any other file
+        os.chmod(temp.name, default_mode())
+        return temp.name
+
+    def add_temp(self, temp_path: str, digest: str) -> bool:
+        """
+        Move a temporary file into place as an object, so objects never
+        appear half written.
+
+        :param temp_path: The path to the temporary file.
+        :param digest: The hex digest of its contents.
+        :return: Whether the object was new, as another thread may have
+         stored the same contents first.
+        """
+        object_path = self.object_path(digest)
+        if object_path.exists():
+            os.unlink(temp_path)
+            return False
+        object_path.parent.mkdir(exist_ok=True)
+        os.replace(temp_path, object_path)
+        return True
+
+    def link(self, digest: str, dest: Path):
+        """
+        Make a file a hard link to a stored object, copying it instead if the
+        file system doesn't support hard links.
+
+        :param digest: The hex digest of the object.
+        :param dest: Where the file should be.
+        """
+        self.link_file(self.object_path(digest), dest)
+
+    def link_file(self, source: Path, dest: Path):
+        """
+        Make a file a hard link to another file, copying it instead if the
+        file system doesn't support hard links.
+
+        :param source: The file to link to.
+        :param dest: Where the file should be.
+        """
+        if dest.exists():
+            dest.unlink()
+        if not self.links_supported():
+            copy2(source, dest)
+            return
+        try:
+            os.link(source, dest)
+        except OSError:
+            # Like when a file already has as many links as it can have
+            logger.debug(f"Unable to hard link {dest}, copying instead")
+            copy2(source, dest)
+
+    def place(self, source: BinaryIO, dest: Path,
+              size: Union[int, None] = None) -> tuple[str, int, bool]:
+        """
+        Write the contents of a file to a path through the object store, or
+        straight to the path if hard links aren't supported. Should be called
+        inside in_use().
+
+        :param source: A file-like object opened for reading bytes.
+        :param dest: Where the file should be.
+        :param size: How big the file is, if known.
+        :return: A tuple of the hex digest, the size in bytes and a bool on
+         whether a new object was stored.
+        """
+        if self.links_supported():
+            digest, size, new = self.store(source, size)
+            self.link(digest, dest)
+            return digest, size, new
+        hasher = hashlib.new(HASH_NAME)
+        size = 0
+        if dest.exists():
+            dest.unlink()
+        with dest.open("wb") as file:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+                file.write(chunk)
+        return hasher.hexdigest(), size, False
+
+    def extract(self, zip_file: ZipFile, dest: Path,
+                pb_func: Callable = lambda got, total, status: None,
+                members: Union[list[ZipInfo], None] = None,
+                workers: int = 1,
+                reuse: Union[Callable[[ZipInfo],
+                                      Union[tuple[Path, Union[str, None]],
+                                            None]],
+                             None] = None) -> dict[str, tuple[str, int]]:
+        """
+        Extract a ZIP file through the object store. Files whose contents are
+        already stored aren't written again, they are only linked.
+
+        Every directory is made first, in the order the ZIP file lists them,
+        and then the files are split across a pool of threads. Each thread
+        opens the ZIP file itself, as a ZipFile can't be read from by more
+        than one thread at once. Decompressing, hashing and writing all let go
+        of the GIL, so this scales with the number of cores.
+
+        :param zip_file: The ZipFile to extract.
+        :param dest: The directory to extract into.
+        :param pb_func: A function to call to update GUIs, etc. Will be passed
+         2 integers and a string positionally with the first being how far,
+         the second being the total, and the third being a status bar. Called
+         after every file is extracted.
+        :param members: The members to extract, or None to extract all of
+         them.
+        :param workers: How many files to extract at once. The ZIP file is
+         read from a single thread if it wasn't opened from a path.
+        :param reuse: A function that is passed each file member and returns
+         a tuple of the path to an identical file that is already on the disk
+         and its hex digest (or None if unknown), or None if the member has to
+         be extracted. Files that can be reused are linked to instead of
+         being read from the ZIP file.
+        :return: A dictionary of each extracted file's name in the ZIP file to
+         a tuple of its hex digest and size. Digests are computed while the
+         files are written, so they never have to be read again.
+        """
+        with self.in_use():
+            if members is None:
+                members = zip_file.infolist()
+            files = []
+            for member in members:
+                target = safe_member_path(dest, member.filename)
+                if member.is_dir():
+                    target.mkdir(parents=True, exist_ok=True)
+                else:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    files.append((member, target))
+            report = count_progress(pb_func)
+            status = "Extracting ZIP file..."
+            extracted = {}
+            new_objects = 0
+            lock = Lock()
+            to_extract = files
+            if reuse is not None:
+                to_extract = []
+                for member, target in files:
+                    found = reuse(member)
+                    if found is None:
+                        to_extract.append((member, target))
+                        continue
+                    source, digest = found
+                    if digest is None:
+                        digest = hash_file(source)
+                    self.link_file(source, target)
+                    extracted[member.filename] = (digest, member.file_size)
+                    report(len(extracted), len(files), status)
+                logger.debug(f"Reused {len(files) - len(to_extract)} files")
+
+            def extract_from(handle: ZipFile, member: ZipInfo, target: Path):
+                nonlocal new_objects
+                with handle.open(member) as source:
+                    digest, size, new = self.place(source, target,
+                                                   member.file_size)
+                if size != member.file_size:
+                    raise ValueError(f"Extracted {size} bytes of "
+                                     f"{member.filename}, expected "
+                                     f"{member.file_size}")
+                with lock:
+                    new_objects += new
+                    extracted[member.filename] = (digest, size)
+                    report(len(extracted), len(files), status)
+
+            if workers <= 1 or zip_file.filename is None or len(to_extract) < 2:
+                for member, target in to_extract:
+                    extract_from(zip_file, member, target)
+            else:
+                handles = []
+                thread_data = local()
+
+                def extract_member(member: ZipInfo, target: Path):
+                    handle = getattr(thread_data, "handle", None)
+                    if handle is None:
+                        handle = thread_data.handle = ZipFile(zip_file.filename)
+                        with lock:
+                            handles.append(handle)
+                    extract_from(handle, member, target)
+
+                try:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = [executor.submit(extract_member, member, target)
+                                   for member, target in to_extract]
+                        try:
+                            for future in futures:
+                                future.result()
+                        except BaseException:
+                            for future in futures:
+                                future.cancel()
+                            raise
+                finally:
+                    for handle in handles:
+                        handle.close()
+            finish_progress(pb_func)
+            logger.debug(f"Extracted {len(extracted)} files, {new_objects} of "
+                         f"them were not already stored")
+            return extracted
+
+    def collect_garbage(self) -> int:
+        """
+        Delete every object that no bundle links to anymore, along with any
+        temporary files left behind by an interrupted extraction. Skipped if
+        anything is being stored in or linked from the store, as objects and
+        temporary files that are about to be linked have no links yet.
+
+        :return: How many bytes were freed.
+        """
+        with self.guard.condition:
+            if self.guard.users > 0 or self.guard.waiting > 0:
+                logger.debug("Object store is in use, not collecting garbage")
+                return 0
+            self.guard.collecting = True
+        try:
+            return self._collect_garbage()
+        finally:
+            with self.guard.condition:
+                self.guard.collecting = False
+                self.guard.condition.notify_all()
+
+    def _collect_garbage(self) -> int:
+        """
+        Does the work of collect_garbage() while no one is using the store.
+        """
+        if not self.path.exists():
+            return 0
+        freed = 0
+        for directory in self.path.iterdir():
+            if directory.is_file() and directory.name.startswith("tmp-"):
+                freed += directory.stat().st_size
+                directory.unlink()
+                continue
+            if not directory.is_dir():
+                continue
+            for object_path in directory.iterdir():
+                stat = object_path.stat()
+                if stat.st_nlink <= 1:
+                    freed += stat.st_size
+                    object_path.unlink()
+            if not any(directory.iterdir()):
+                directory.rmdir()
+        logger.debug(f"Collected {freed} bytes of unreferenced objects")
+        return freed
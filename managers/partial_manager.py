@@ -0,0 +1,203 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from json import dumps, loads
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Iterator, Union
+
+from helpers.create_logger import create_logger
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+PARTIALS_DIR = ".partial"
+# Partial downloads that haven't been touched in this many seconds are deleted
+PARTIAL_MAX_AGE = 7 * 24 * 60 * 60
+
+_claims = {}
+_claims_lock = Lock()
+
+
+def claim_lock(data_path: Path) -> Lock:
+    """
+    Get the lock that has to be held to use a partial download. There is one
+    per data file, shared by every PartialManager.
+
+    :param data_path: The path to the data file of the download.
+    :return: A Lock.
+    """
+    with _claims_lock:
+        key = os.path.abspath(data_path)
+        if key not in _claims:
+            _claims[key] = Lock()
+        return _claims[key]
+
+
+class PartialManager:
+    def __init__(self, bundle_path: Path):
+        """
+        Make a PartialManager, which keeps unfinished downloads under the
+        bundles directory so they can be resumed later. Every download has a
+        data file and a small JSON file with its URL, expected length and
+        ETag. Only one download of a URL can use its files at once, see
+        claim().
+
+        :param bundle_path: The path to the bundles.
+        """
+        self.path = bundle_path / PARTIALS_DIR
+
+    def key(self, url: str) -> str:
+        """
+        Get the name a download is stored under.
+
+        :param url: The URL being downloaded.
+        :return: A string.
+        """
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def data_path(self, url: str) -> Path:
+        """
+        Get the path to the data of a download.
+
+        :param url: The URL being downloaded.
+        :return: A Path.
+        """
+        return self.path / f"{self.key(url)}.part"
+
+    def info_path(self, url: str) -> Path:
+        """
+        Get the path to the information about a download.
+
+        :param url: The URL being downloaded.
+        :return: A Path.
+        """
+        return self.path / f"{self.key(url)}.json"
+
+    @contextmanager
+    def claim(self, url: str) -> Iterator[None]:
+        """
+        Take ownership of the partial download of a URL until the block
+        exits. If another download of the same URL owns it, this waits for
+        that download to finish. Hold this from before the download starts
+        until its data file has been moved or discarded.
+
+        :param url: The URL being downloaded.
+        """
+        lock = claim_lock(self.data_path(url))
+        if not lock.acquire(blocking=False):
+            logger.debug(f"{url} is already being downloaded, waiting")
+            lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def is_claimed(self, path: Path) -> bool:
+        """
+        Check whether a download owns a file in the partial download store.
+
+        :param path: The path to the data or information file.
+        :return: A bool.
+        """
+        with _claims_lock:
+            lock = _claims.get(os.path.abspath(path.with_suffix(".part")))
+        return lock is not None and lock.locked()
+
+    def get(self, url: str) -> tuple[int, Union[int, None], Union[str, None]]:
+        """
+        Get how far a download got.
+
+        :param url: The URL being downloaded.
+        :return: A tuple of how many bytes are already downloaded, the
+         expected length (or None if unknown) and the ETag (or None if the
+         server didn't send one). If there is no usable partial download, the
+         first item is 0.
+        """
+        data_path = self.data_path(url)
+        try:
+            info = loads(self.info_path(url).read_text())
+            if info["url"] != url:
+                raise ValueError("URL does not match")
+            have = data_path.stat().st_size
+        except (FileNotFoundError, KeyError, ValueError):
+            return 0, None, None
+        length = info.get("length")
+        if length is not None and have > length:
+            logger.warning(f"Partial download of {url} is too long, "
+                           f"starting over")
+            self.discard(url)
+            return 0, None, None
+        return have, length, info.get("etag")
+
+    def start(self, url: str, length: Union[int, None],
+              etag: Union[str, None]):
+        """
+        Remember what is being downloaded, so it can be resumed if it breaks.
+
+        :param url: The URL being downloaded.
+        :param length: The length the file will have, or None if unknown.
+        :param etag: The ETag the server sent, or None.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.info_path(url).write_text(dumps({
+            "url": url, "length": length, "etag": etag
+        }))
+
+    def discard(self, url: str):
+        """
+        Delete a partial download.
+
+        :param url: The URL that was being downloaded.
+        """
+        self.data_path(url).unlink(missing_ok=True)
+        self.info_path(url).unlink(missing_ok=True)
+
+    def clean(self, max_age: float = PARTIAL_MAX_AGE) -> int:
+        """
+        Delete partial downloads that haven't been touched in a while, and
+        files that are missing their other half. Downloads that are claimed
+        are left alone.
+
+        :param max_age: How old in seconds a partial download can be.
+        :return: How many files were deleted.
+        """
+        if not self.path.exists():
+            return 0
+        deleted = 0
+        now = time()
+        for path in self.path.iterdir():
+            if self.is_claimed(path):
+                continue
+            other = path.with_suffix(".json" if path.suffix == ".part"
+                                     else ".part")
+            try:
+                stale = now - path.stat().st_mtime > max_age
+            except FileNotFoundError:
+                continue
+            if stale or not other.exists():
+                logger.debug(f"Deleting stale partial download {path}")
+                path.unlink(missing_ok=True)
+                deleted += 1
+        return deleted
@@ -0,0 +1,110 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from helpers.create_logger import create_logger
+from helpers.operating_system import default_mode
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+STAGING_PREFIX = ".staging-"
+
+
+class StagingManager:
+    def __init__(self, bundle_path: Path):
+        """
+        Make a StagingManager, which gives every bundle being downloaded a
+        private directory inside the bundles directory to be filled in. The
+        directories start with a dot so indexing skips them, and they are on
+        the same file system as the bundles, so a finished bundle is
+        published with a single atomic rename. This only guarantees that a
+        bundle directory is either complete or absent, and that 2 downloads
+        of the same release can't both publish. Everything the downloads
+        share, like partial downloads, the asset cache and the object store,
+        has its own locking.
+
+        :param bundle_path: The path to the bundles.
+        """
+        self.path = bundle_path
+
+    def create(self) -> Path:
+        """
+        Make a new, empty staging directory.
+
+        :return: The path to the directory.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        staged = Path(mkdtemp(prefix=STAGING_PREFIX, dir=self.path))
+        logger.debug(f"Staging in {staged}")
+        return staged
+
+    def publish(self, staged: Path, dest: Path):
+        """
+        Move a finished staging directory to where the bundle should be. Will
+        raise FileExistsError if something is already there.
+
+        :param staged: The path to the staging directory.
+        :param dest: The path the bundle should have.
+        """
+        if dest.exists():
+            raise FileExistsError(f"{dest} already exists")
+        logger.debug(f"Publishing {staged} to {dest}")
+        # mkdtemp makes directories only we can use, but a bundle should be
+        # like any other directory
+        os.chmod(staged, default_mode(directory=True))
+        try:
+            os.rename(staged, dest)
+        except OSError as e:
+            # Another download finished first
+            if dest.exists():
+                raise FileExistsError(f"{dest} already exists") from e
+            raise
+
+    def discard(self, staged: Path):
+        """
+        Delete a staging directory.
+
+        :param staged: The path to the staging directory.
+        """
+        logger.debug(f"Discarding {staged}")
+        rmtree(staged, ignore_errors=True)
+
+    def clean(self) -> int:
+        """
+        Delete every staging directory, which is left behind when the
+        program stops in the middle of a download. Only call this when no
+        downloads are running, like at startup.
+
+        :return: How many directories were deleted.
+        """
+        if not self.path.exists():
+            return 0
+        deleted = 0
+        for path in self.path.iterdir():
+            if path.is_dir() and path.name.startswith(STAGING_PREFIX):
+                logger.warning(f"Deleting stale staging directory {path}")
+                self.discard(path)
+                deleted += 1
+        return deleted
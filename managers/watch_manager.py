@@ -0,0 +1,304 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+from pathlib import Path
+from threading import Event, Thread
+from time import monotonic
+from typing import Union
+
+from helpers.create_logger import create_logger
+from helpers.operating_system import on_linux
+from managers.bundle_manager import BundleManager, METADATA_NAME
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+BUNDLE_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CLOSE_WRITE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    def __init__(self):
+        """
+        Make a tiny wrapper around the Linux inotify API. Raises OSError if
+        inotify isn't available.
+        """
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("Unable to find libc")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        """
+        Start watching a directory.
+
+        :param path: The path to the directory.
+        :param mask: The events to watch for.
+        :return: The watch descriptor.
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        return wd
+
+    def read(self, timeout: float) -> list[tuple[int, int, str]]:
+        """
+        Wait for events.
+
+        :param timeout: How long to wait in seconds.
+        :return: A list of tuples of the watch descriptor, event mask and the
+         name of the file the event happened to. (or "")
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if len(readable) == 0:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        """
+        Stop watching everything.
+        """
+        os.close(self.fd)
+
+
+class WatchManager:
+    def __init__(self, bundle_manager: BundleManager, debounce: float = 1,
+                 poll_interval: float = 2, use_inotify: bool = True):
+        """
+        Make a WatchManager, which watches the bundles directory and applies
+        added, changed or removed bundles to the BundleManager without
+        indexing everything. Uses inotify on Linux and polls otherwise.
+
+        :param bundle_manager: The BundleManager to update.
+        :param debounce: How long in seconds the directory must be quiet
+         before changes are applied, so half-copied bundles aren't loaded over
+         and over.
+        :param poll_interval: How often in seconds to look at the directory
+         when polling.
+        :param use_inotify: Whether to use inotify when it is available.
+        """
+        self.bundle_manager = bundle_manager
+        self.path = bundle_manager.bundle_path
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and on_linux()
+        self.on_change = lambda added, removed, updated: None
+        self.thread = None
+        self.stop_event = Event()
+
+    @property
+    def running(self) -> bool:
+        """
+        Get whether the watcher thread is running.
+
+        :return: A bool.
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """
+        Start watching in a background thread. Does nothing if already
+        watching.
+        """
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.path.mkdir(parents=True, exist_ok=True)
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = Inotify()
+            except (OSError, AttributeError):
+                logger.exception("Unable to use inotify, polling instead")
+        if inotify is not None:
+            target = lambda: self.watch_inotify(inotify)
+        else:
+            target = self.watch_polling
+        self.thread = Thread(target=target, daemon=True)
+        logger.debug(f"Watching {self.path} with thread {self.thread}")
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop watching.
+        """
+        logger.debug(f"Stopping watching {self.path}")
+        self.stop_event.set()
+        if self.running:
+            self.thread.join()
+        self.thread = None
+
+    def apply(self, paths: set[Path]):
+        """
+        Apply changes to the BundleManager and tell whoever is listening.
+
+        :param paths: The paths of the bundles that may have changed.
+        """
+        logger.debug(f"Applying changes to {len(paths)} paths")
+        try:
+            added, removed, updated = \
+                self.bundle_manager.update_bundles(sorted(paths))
+        except Exception:
+            logger.exception("Error while applying bundle changes")
+            return
+        if len(added) + len(removed) + len(updated) > 0:
+            self.on_change(added, removed, updated)
+
+    def snapshot(self) -> dict[Path, Union[tuple, None]]:
+        """
+        Take a look at what is in the bundles directory.
+
+        :return: A dictionary of each bundle path to the modification time of
+         the directory and the size and modification time of its
+         metadata.json file, or None if it has no metadata.json file.
+        """
+        result = {}
+        for path in self.path.glob("*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                if not path.is_dir():
+                    continue
+                directory = path.stat()
+                metadata = (path / METADATA_NAME).stat()
+                result[path] = (directory.st_mtime_ns, metadata.st_size,
+                                metadata.st_mtime_ns)
+            except FileNotFoundError:
+                result[path] = None
+        return result
+
+    def watch_polling(self):
+        """
+        Watch the bundles directory by comparing snapshots.
+        """
+        logger.debug(f"Polling {self.path} every {self.poll_interval}s")
+        last = self.snapshot()
+        pending = set()
+        last_change = monotonic()
+        while not self.stop_event.wait(self.poll_interval):
+            current = self.snapshot()
+            changed = {path for path in last.keys() | current.keys()
+                       if last.get(path) != current.get(path)}
+            last = current
+            if len(changed) > 0:
+                pending |= changed
+                last_change = monotonic()
+            elif len(pending) > 0 and \
+                    monotonic() - last_change >= self.debounce:
+                self.apply(pending)
+                pending = set()
+
+    def watch_inotify(self, inotify: Inotify):
+        """
+        Watch the bundles directory with inotify. The bundles directory and
+        every bundle directory in it are watched, so both new bundles and
+        rewritten metadata files are noticed.
+
+        :param inotify: The Inotify instance to read from.
+        """
+        logger.debug(f"Watching {self.path} with inotify")
+        root_wd = inotify.add_watch(self.path, ROOT_MASK)
+        watches = {}
+
+        def watch_bundle(path: Path):
+            try:
+                watches[inotify.add_watch(path, BUNDLE_MASK)] = path
+            except OSError:
+                logger.debug(f"Unable to watch {path}")
+
+        for path in self.path.glob("*"):
+            if path.is_dir() and not path.name.startswith("."):
+                watch_bundle(path)
+        pending = set()
+        last_change = monotonic()
+        try:
+            while not self.stop_event.is_set():
+                events = inotify.read(min(self.debounce, 0.5))
+                for wd, mask, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        logger.warning("inotify queue overflowed, rescanning")
+                        pending |= set(self.snapshot().keys())
+                        pending |= {b.path for b in
+                                    self.bundle_manager.bundles}
+                    elif wd == root_wd:
+                        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                            logger.warning(f"{self.path} went away")
+                            pending |= {b.path for b in
+                                        self.bundle_manager.bundles}
+                            continue
+                        if name == "" or name.startswith("."):
+                            continue
+                        path = self.path / name
+                        if mask & (IN_CREATE | IN_MOVED_TO) and \
+                                mask & IN_ISDIR:
+                            watch_bundle(path)
+                        pending.add(path)
+                    elif wd in watches:
+                        if mask & IN_IGNORED:
+                            del watches[wd]
+                            continue
+                        pending.add(watches[wd])
+                if len(events) > 0:
+                    last_change = monotonic()
+                elif len(pending) > 0 and \
+                        monotonic() - last_change >= self.debounce:
+                    self.apply(pending)
+                    pending = set()
+        finally:
+            inotify.close()
@@ -0,0 +1,139 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import requests
+from requests.exceptions import ChunkedEncodingError
+
+from managers import github_manager
+from managers.github_manager import GitHubManager
+
+ROOT = Path(__file__).resolve().parent.parent
+# Every response for a file is cut after this many bytes the first time
+CUT_AFTER = 100000
+SIZE = 300000
+# What a response that is cut short raises
+CUT_ERRORS = (requests.ConnectionError, ChunkedEncodingError)
+
+
+class DownloadFileTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = TemporaryDirectory()
+        self.addCleanup(self.temp.cleanup)
+        self.assets = Path(self.temp.name) / "assets"
+        self.assets.mkdir()
+        self.bundles = Path(self.temp.name) / "bundles"
+        self.bundles.mkdir()
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "tools.stub_http_server",
+             "--directory", str(self.assets), "--port", "0",
+             "--cut-after", str(CUT_AFTER), "--cut-times", "1"],
+            cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True
+        )
+        self.addCleanup(self.server.wait)
+        self.addCleanup(self.server.terminate)
+        line = self.server.stdout.readline()
+        self.base_url = re.search(r"http://\S+/", line).group(0)
+        backoff = mock.patch.object(github_manager, "DOWNLOAD_BACKOFF", 0.01)
+        backoff.start()
+        self.addCleanup(backoff.stop)
+
+    def make_manager(self, retries: int) -> tuple[GitHubManager, list[int]]:
+        manager = GitHubManager("token", "owner/repo", self.bundles,
+                                retries=retries)
+        self.addCleanup(manager.session.close)
+        statuses = []
+        manager.session.hooks["response"].append(
+            lambda response, *args, **kwargs:
+            statuses.append(response.status_code)
+        )
+        return manager, statuses
+
+    def download(self, manager: GitHubManager, url: str,
+                 expected_length: int) -> Path:
+        with manager.partials.claim(url):
+            return manager.download_file(url, expected_length,
+                                         lambda got: None)
+
+    def test_resumes_with_range(self):
+        data = bytes(range(256)) * (SIZE // 256)
+        (self.assets / "asset.zip").write_bytes(data)
+        manager, statuses = self.make_manager(retries=1)
+        path = self.download(manager, self.base_url + "asset.zip", len(data))
+        self.assertEqual(path.read_bytes(), data)
+        self.assertEqual(statuses, [200, 206])
+
+    def test_discards_partial_when_etag_changes(self):
+        url = self.base_url + "asset.zip"
+        (self.assets / "asset.zip").write_bytes(b"a" * SIZE)
+        manager, statuses = self.make_manager(retries=0)
+        with self.assertRaises(CUT_ERRORS):
+            self.download(manager, url, SIZE)
+        self.assertGreater(manager.partials.get(url)[0], 0)
+        # The asset changed on the server, but is still as long
+        (self.assets / "asset.zip").write_bytes(b"b" * SIZE)
+        path = self.download(manager, url, SIZE)
+        self.assertEqual(path.read_bytes(), b"b" * SIZE)
+        self.assertEqual(statuses, [200, 200])
+
+    def cut_download(self, manager: GitHubManager, url: str,
+                     recorded_length: int):
+        """
+        Leave a partial download of an asset behind, then record a different
+        length for it, like when a server kept the ETag of a file that
+        changed.
+        """
+        with self.assertRaises(CUT_ERRORS):
+            self.download(manager, url, SIZE)
+        have, _, etag = manager.partials.get(url)
+        self.assertGreater(have, 0)
+        manager.partials.start(url, recorded_length, etag)
+
+    def test_resumed_download_too_short(self):
+        url = self.base_url + "asset.zip"
+        (self.assets / "asset.zip").write_bytes(b"a" * SIZE)
+        manager, statuses = self.make_manager(retries=0)
+        self.cut_download(manager, url, SIZE + 1000)
+        with self.assertRaisesRegex(requests.ConnectionError,
+                                    f"ended after {SIZE} of {SIZE + 1000}"):
+            self.download(manager, url, SIZE + 1000)
+        self.assertEqual(statuses, [200, 206])
+
+    def test_resumed_download_too_long(self):
+        url = self.base_url + "asset.zip"
+        (self.assets / "asset.zip").write_bytes(b"a" * SIZE)
+        manager, statuses = self.make_manager(retries=0)
+        self.cut_download(manager, url, SIZE - 1000)
+        with self.assertRaisesRegex(ValueError, f"expected {SIZE - 1000}"):
+            self.download(manager, url, SIZE - 1000)
+        self.assertEqual(statuses, [200, 206])
+        # Too long to ever be resumed, so it was thrown away
+        self.assertEqual(manager.partials.get(url)[0], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from github.GithubException import BadCredentialsException
+
+from helpers.github_api import GitHubAPI, GraphQLReleasePages, \
+    RELEASES_PER_PAGE, ResponseCache
+
+ROOT = Path(__file__).resolve().parent.parent
+RELEASES = 75
+TOKEN = "secret"
+ASSET_URL = "http://127.0.0.1:8765"
+REPO = "adafruit/Adafruit_CircuitPython_Bundle"
+
+
+class GraphQLReleasePagesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = subprocess.Popen(
+            [sys.executable, "-m", "tools.stub_graphql_server",
+             "--port", "0", "--releases", str(RELEASES), "--token", TOKEN,
+             "--asset-url", ASSET_URL],
+            cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True
+        )
+        line = cls.server.stdout.readline()
+        cls.api_url = re.search(r"http://[^/\s]+", line).group(0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait()
+
+    def make_pages(self, token: str = TOKEN) -> GraphQLReleasePages:
+        api = GitHubAPI(token, ResponseCache(), api_url=self.api_url)
+        self.addCleanup(api.session.close)
+        pages = api.get_releases(REPO, graphql=True)
+        self.assertIsInstance(pages, GraphQLReleasePages)
+        return pages
+
+    def test_cursor_paging(self):
+        pages = self.make_pages()
+        session = pages.api.session
+        post = mock.patch.object(session, "post", wraps=session.post)
+        queries = post.start()
+        self.addCleanup(post.stop)
+        # Page 2 is found with the cursors of the pages before it
+        last = pages.get_page(2)
+        self.assertEqual(len(last), RELEASES - 2 * RELEASES_PER_PAGE)
+        releases, next_page = pages.loaded()
+        self.assertEqual(next_page, 3)
+        self.assertEqual([r.id for r in releases],
+                         [1000 + index for index in range(RELEASES)])
+        self.assertEqual(pages.last_page, 2)
+        self.assertFalse(pages.exists(3))
+        self.assertEqual(pages.get_page(3), [])
+        # 1 query per page, loaded pages aren't asked for again
+        pages.get_page(1)
+        self.assertEqual(queries.call_count, 3)
+        afters = [call.kwargs["json"]["variables"]["after"]
+                  for call in queries.call_args_list]
+        self.assertEqual(afters[0], None)
+        self.assertEqual(len(set(afters)), 3)
+
+    def test_asset_mapping(self):
+        release = self.make_pages().get_page(0)[0]
+        self.assertEqual(release.id, 1000)
+        self.assertEqual(release.tag_name, "20211010")
+        self.assertEqual(release.title, "October 10, 2021 auto-release")
+        self.assertEqual(release.published_at.isoformat(),
+                         "2021-10-10T00:00:00+00:00")
+        assets = release.get_assets()
+        self.assertEqual([asset.name for asset in assets], [
+            "adafruit-circuitpython-bundle-py-20211010.zip",
+            "adafruit-circuitpython-bundle-6.x-mpy-20211010.zip",
+            "adafruit-circuitpython-bundle-7.x-mpy-20211010.zip",
+            "adafruit-circuitpython-bundle-examples-20211010.zip",
+            "adafruit-circuitpython-bundle-20211010.json"
+        ])
+        self.assertEqual([asset.id for asset in assets],
+                         [10000, 10001, 10002, 10003, 10004])
+        self.assertEqual([asset.size for asset in assets],
+                         [1024, 2048, 3072, 4096, 5120])
+        for asset in assets:
+            self.assertEqual(asset.browser_download_url,
+                             f"{ASSET_URL}/{asset.name}")
+
+    def test_bad_token(self):
+        with self.assertRaises(BadCredentialsException):
+            self.make_pages("wrong").get_page(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from itertools import combinations
+from unittest import mock
+
+from helpers import search_index
+from helpers.search_index import SearchIndex, substring_distance
+
+# Module names from a real bundle, plus their PyPI names
+NAMES = ("adafruit_bme280", "adafruit_bme680", "adafruit_bmp280",
+         "adafruit_bus_device", "adafruit_display_shapes",
+         "adafruit_display_text", "adafruit_displayio_sh1106",
+         "adafruit_displayio_ssd1306", "adafruit_dotstar", "adafruit_hid",
+         "adafruit_minimqtt", "adafruit_motor", "adafruit_motorkit",
+         "adafruit_requests", "adafruit_ssd1306", "neopixel", "simpleio")
+
+# Words to make a big catalog of adafruit_* modules from
+WORDS = ("display", "text", "shapes", "ssd1306", "bme280", "motor", "hid",
+         "requests", "minimqtt", "dotstar", "led", "animation", "esp32spi",
+         "imageload", "ble", "io", "lis3dh", "bno055", "pca9685", "ht16k33",
+         "matrix", "portal", "magtag", "clue", "ina219", "gps", "rfm9x",
+         "ntp", "ticks", "debouncer")
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex(
+            (name, (name, name.replace("_", "-"))) for name in NAMES
+        )
+
+    def test_exact_prefix_substring_order(self):
+        self.assertEqual(self.index.search("neopixel"), ["neopixel"])
+        self.assertEqual(self.index.search("adafruit_motor"),
+                         ["adafruit_motor", "adafruit_motorkit"])
+        self.assertEqual(self.index.search("ssd1306"),
+                         ["adafruit_ssd1306", "adafruit_displayio_ssd1306"])
+
+    def test_transposition(self):
+        self.assertEqual(self.index.search("neopxiel"), ["neopixel"])
+        self.assertEqual(self.index.search("reqeusts"), ["adafruit_requests"])
+        self.assertEqual(self.index.search("bme208"), ["adafruit_bme280"])
+        self.assertIn("adafruit_ssd1306", self.index.search("ssd1036"))
+        self.assertIn("adafruit_display_text", self.index.search("dispaly"))
+
+    def test_dropped_letter(self):
+        self.assertEqual(self.index.search("motr"),
+                         ["adafruit_motor", "adafruit_motorkit"])
+        self.assertEqual(self.index.search("neopixl"), ["neopixel"])
+        self.assertIn("adafruit_display_text", self.index.search("dislay"))
+
+    def test_fuzzy_after_exact(self):
+        # One typo away from bme680 and bmp280, but those come after
+        results = self.index.search("bme280")
+        self.assertEqual(results[0], "adafruit_bme280")
+        self.assertCountEqual(results[1:],
+                              ["adafruit_bme680", "adafruit_bmp280"])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("xyzw"), [])
+        # Too short to be matched fuzzily
+        self.assertEqual(self.index.search("hdi"), [])
+
+    def test_fuzzy_candidates_are_capped(self):
+        names = [f"adafruit_{first}_{second}"
+                 for first, second in combinations(WORDS, 2)]
+        self.assertGreater(len(names), 400)
+        index = SearchIndex((name, (name, name.replace("_", "-")))
+                            for name in names)
+        for query in ("adafruit_dis", "dispaly", "adafriut_motor"):
+            with mock.patch.object(search_index, "substring_distance",
+                                   wraps=substring_distance) as scored:
+                results = index.search(query)
+            self.assertGreater(len(results), 0)
+            # Each name normalizes to one string, so one call per candidate
+            self.assertLessEqual(scored.call_count,
+                                 search_index.FUZZY_CANDIDATES)
+
+    def test_substring_distance(self):
+        self.assertEqual(substring_distance("motr", "adafruit_motor", 1), 1)
+        self.assertEqual(substring_distance("neopxiel", "neopixel", 1), 1)
+        self.assertEqual(substring_distance("motor", "adafruit_motor", 1), 0)
+        self.assertIsNone(substring_distance("bme208", "adafruit_bme680", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares the memory used by the old Module layout (a __dict__ per module
+# and a freshly built Module for every dependency) against the ModuleTable /
+# slotted Module layout. Run from the repository root:
+#
+#   python -m tools.bench_module_memory --bundles 12 --modules 400
+
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+
+from helpers.file_size import ByteSize
+from managers.bundle_manager import DependencyGraph, ModuleTable
+
+VERSIONS = ("py", "6.x-mpy", "7.x-mpy", "8.x-mpy")
+
+
+class LegacyModule:
+    def __init__(self, path: Path, data: dict):
+        """
+        A copy of how Module used to be laid out, only used for comparison.
+
+        :param path: The path to the module.
+        :param data: A dictionary containing the dependencies for all modules.
+        """
+        self.path = path
+        self.name = path.name
+        self.is_package = data[self.path.stem]["package"]
+        self.pypi_name = data[self.path.stem]["pypi_name"]
+        self.version = data[self.path.stem]["version"]
+        self.repo = data[self.path.stem]["repo"]
+        self.dependencies = []
+        for dependency in data[self.path.stem]["dependencies"]:
+            self.dependencies.append(
+                LegacyModule(self.path.parent / dependency, data)
+            )
+
+
+def make_dependencies(bundle: int, count: int) -> dict:
+    """
+    Make dependency data shaped like the Adafruit bundle's JSON file. Every
+    module depends on adafruit_bus_device, and all but the first 10 also
+    depend on one of the first 10, like drivers depending on helper
+    libraries.
+
+    :param bundle: The index of the bundle, used to vary version strings.
+    :param count: How many modules to make.
+    :return: A dictionary.
+    """
+    data = {"adafruit_bus_device": {
+        "package": True, "pypi_name": "adafruit-circuitpython-busdevice",
+        "version": f"5.{bundle}.0", "dependencies": [],
+        "repo": "https://github.com/adafruit/Adafruit_CircuitPython_BusDevice"
+    }}
+    for index in range(count):
+        dependencies = ["adafruit_bus_device"]
+        if index >= 10:
+            dependencies.append(f"adafruit_module_{index % 10}")
+        data[f"adafruit_module_{index}"] = {
+            "package": index % 4 == 0,
+            "pypi_name": f"adafruit-circuitpython-module-{index}",
+            "version": f"{index % 7}.{bundle}.0",
+            "repo": f"https://github.com/adafruit/Module_{index}",
+            "dependencies": dependencies
+        }
+    return data
+
+
+def measure(build) -> tuple[int, object]:
+    """
+    Measure how much memory the object returned by a function keeps alive.
+
+    :param build: A function that takes no arguments.
+    :return: A tuple of the bytes still allocated and the object.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main():
+    parser = ArgumentParser(description="Compare Module memory layouts.")
+    parser.add_argument("--bundles", type=int, default=12)
+    parser.add_argument("--modules", type=int, default=400)
+    args = parser.parse_args()
+
+    bundles = [make_dependencies(b, args.modules) for b in range(args.bundles)]
+    lib = Path("bundles") / "bundle" / "lib"
+
+    def build_legacy():
+        loaded = []
+        for data in bundles:
+            for _ in VERSIONS:
+                loaded.append({name: LegacyModule(lib / name, data)
+                               for name in data})
+        return loaded
+
+    def build_compact():
+        loaded = []
+        for data in bundles:
+            table = ModuleTable(data)
+            for _ in VERSIONS:
+                loaded.append(DependencyGraph(lib, list(data), table))
+        return loaded
+
+    legacy, _ = measure(build_legacy)
+    compact, _ = measure(build_compact)
+    modules = args.bundles * len(VERSIONS) * (args.modules + 1)
+    print(f"{args.bundles} bundles x {len(VERSIONS)} versions x "
+          f"{args.modules + 1} modules = {modules} modules")
+    print(f"Old layout:     {ByteSize(legacy)}")
+    print(f"Compact layout: {ByteSize(compact)}")
+    print(f"Saved:          {ByteSize(legacy - compact)} "
+          f"({(1 - compact / legacy) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares ZipFile.extractall against ObjectManager.extract with one and with
+# several threads, on a synthetic archive laid out like an Adafruit bundle
+# variant. Every run extracts into a fresh directory so no run benefits from
+# objects stored by an earlier one. Run from the repository root:
+#
+#   python -m tools.bench_zip_extract --modules 400 --workers 1 2 4 8
+
+import os
+import random
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from helpers.file_size import ByteSize
+from managers.object_manager import ObjectManager
+
+# Roughly what a module in the bundle looks like: a few source files, most of
+# them a few kilobytes, some much bigger
+FILE_SIZES = (512, 2048, 4096, 8192, 16384, 65536)
+
+
+def make_archive(path: Path, modules: int, seed: int = 0) -> tuple[int, int]:
+    """
+    Make a ZIP file shaped like a bundle variant, with a lib folder of single
+    file modules and packages, and an examples folder.
+
+    :param path: Where to write the ZIP file.
+    :param modules: How many modules to put in it.
+    :param seed: The seed for the random contents.
+    :return: A tuple of the number of files and their total size.
+    """
+    rng = random.Random(seed)
+    root = "adafruit-circuitpython-bundle-py-20211010"
+    files = 0
+    size = 0
+    with ZipFile(path, "w", ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(f"{root}/", "")
+        zip_file.writestr(f"{root}/lib/", "")
+        zip_file.writestr(f"{root}/examples/", "")
+        for index in range(modules):
+            names = [f"lib/adafruit_module_{index}.py"]
+            if index % 4 == 0:
+                zip_file.writestr(f"{root}/lib/adafruit_module_{index}/", "")
+                names = [f"lib/adafruit_module_{index}/{name}.py"
+                         for name in ("__init__", "core", "helpers",
+                                      "constants")[:rng.randint(2, 4)]]
+            names.append(f"examples/module_{index}_simpletest.py")
+            for name in names:
+                # Half text-like and half random, so it compresses like code
+                length = rng.choice(FILE_SIZES)
+                words = b"def read(self):\n    return self._buffer\n"
+                data = (words * (length // len(words) // 2 + 1))[:length // 2]
+                data += rng.randbytes(length - len(data))
+                zip_file.writestr(f"{root}/{name}", data)
+                files += 1
+                size += len(data)
+    return files, size
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark ZIP extraction.")
+    parser.add_argument("--modules", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, min(8, os.cpu_count() or 1)])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp:
+        temp = Path(temp)
+        archive = temp / "bundle.zip"
+        files, size = make_archive(archive, args.modules)
+        print(f"{files} files, {str(ByteSize(size))} uncompressed, "
+              f"{str(ByteSize(archive.stat().st_size))} compressed, "
+              f"{os.cpu_count()} CPUs")
+
+        def best_of(extract) -> float:
+            best = None
+            for run in range(args.runs):
+                dest = temp / f"run-{perf_counter()}"
+                dest.mkdir()
+                start = perf_counter()
+                extract(dest)
+                elapsed = perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            return best
+
+        def extract_all(dest: Path):
+            with ZipFile(archive) as zip_file:
+                zip_file.extractall(dest)
+
+        baseline = best_of(extract_all)
+        print(f"ZipFile.extractall:       {baseline:.3f}s")
+        expected = None
+        for workers in dict.fromkeys(args.workers):
+            def extract_objects(dest: Path):
+                nonlocal expected
+                objects = ObjectManager(dest / "bundles")
+                with ZipFile(archive) as zip_file:
+                    extracted = objects.extract(zip_file, dest / "bundle",
+                                                workers=workers)
+                if expected is None:
+                    expected = extracted
+                elif extracted != expected:
+                    raise AssertionError(f"Extracting with {workers} threads "
+                                         f"gave different files")
+
+            elapsed = best_of(extract_objects)
+            print(f"ObjectManager, {workers} thread(s): {elapsed:.3f}s "
+                  f"({baseline / elapsed:.2f}x extractall)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A stand-in for GitHub's GraphQL API, for testing GraphQLReleasePages
+# without a network. Answers the releases query with made up releases of a
+# bundle, paged with cursors, and sends rate limit headers. Run from the
+# repository root:
+#
+#   python -m tools.stub_graphql_server --port 8766 --releases 75 \
+#       --token secret --asset-url http://127.0.0.1:8765
+#
+# Then point a GitHubAPI at it with api_url="http://127.0.0.1:8766". Asset
+# download URLs start with --asset-url, so the assets can be served with
+# tools.stub_http_server.
+
+from argparse import ArgumentParser
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from threading import Lock
+from time import time
+from typing import Union
+
+VARIANTS = ("py", "6.x-mpy", "7.x-mpy")
+RATE_LIMIT = 5000
+
+
+class StubGraphQLHandler(BaseHTTPRequestHandler):
+    releases = 75
+    token: Union[str, None] = None
+    asset_url = "http://127.0.0.1:8765"
+    remaining = RATE_LIMIT
+    remaining_lock = Lock()
+
+    def make_release(self, index: int) -> dict:
+        """
+        Make a release node, newest first like GitHub orders them.
+
+        :param index: The index of the release, 0 being the newest.
+        :return: A dictionary.
+        """
+        released = datetime(2021, 10, 10, tzinfo=timezone.utc) - \
+            timedelta(days=index)
+        tag = released.strftime("%Y%m%d")
+        names = [f"adafruit-circuitpython-bundle-{variant}-{tag}.zip"
+                 for variant in VARIANTS]
+        names.append(f"adafruit-circuitpython-bundle-examples-{tag}.zip")
+        names.append(f"adafruit-circuitpython-bundle-{tag}.json")
+        return {
+            "databaseId": 1000 + index,
+            "tagName": tag,
+            "name": f"{released:%B %d, %Y} auto-release",
+            "url": f"https://github.com/adafruit/Adafruit_CircuitPython_"
+                   f"Bundle/releases/tag/{tag}",
+            "publishedAt": released.isoformat().replace("+00:00", "Z"),
+            "releaseAssets": {"nodes": [{
+                "databaseId": (1000 + index) * 10 + number,
+                "name": name,
+                "size": 1024 * (number + 1),
+                "downloadUrl": f"{self.asset_url}/{name}"
+            } for number, name in enumerate(names)]}
+        }
+
+    def send_json(self, status: int, body: dict):
+        """
+        Send a JSON response with rate limit headers.
+
+        :param status: The HTTP status.
+        :param body: The body to encode.
+        """
+        with self.remaining_lock:
+            remaining = StubGraphQLHandler.remaining
+        data = dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-RateLimit-Limit", str(RATE_LIMIT))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(int(time()) + 60 * 60))
+        self.send_header("X-RateLimit-Resource", "graphql")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != "/graphql":
+            self.send_json(404, {"message": "Not Found"})
+            return
+        if self.token is not None and \
+                self.headers.get("Authorization") != f"bearer {self.token}":
+            self.send_json(401, {"message": "Bad credentials"})
+            return
+        with self.remaining_lock:
+            StubGraphQLHandler.remaining -= 1
+        request = loads(self.rfile.read(int(self.headers["Content-Length"])))
+        variables = request.get("variables", {})
+        if "releases" not in request.get("query", ""):
+            self.send_json(200, {"errors": [{
+                "message": "Only the releases query is supported"
+            }]})
+            return
+        start = 0
+        if variables.get("after") is not None:
+            start = int(b64decode(variables["after"]).decode().split(":")[1])
+        end = min(start + variables.get("first", 30), self.releases)
+        self.log_message(f"Releases {start} to {end}")
+        self.send_json(200, {"data": {"repository": {"releases": {
+            "pageInfo": {
+                "hasNextPage": end < self.releases,
+                "endCursor": b64encode(f"cursor:{end}".encode()).decode()
+            },
+            "nodes": [self.make_release(index)
+                      for index in range(start, end)]
+        }}}})
+
+
+def main():
+    parser = ArgumentParser(description="Answer release queries like "
+                                        "GitHub's GraphQL API.")
+    parser.add_argument("--port", type=int, default=8766,
+                        help="The port to serve on, or 0 for any free port.")
+    parser.add_argument("--releases", type=int, default=75)
+    parser.add_argument("--token", default=None,
+                        help="Only accept this token.")
+    parser.add_argument("--asset-url", default="http://127.0.0.1:8765",
+                        help="Where asset download URLs point to.")
+    args = parser.parse_args()
+
+    StubGraphQLHandler.releases = args.releases
+    StubGraphQLHandler.token = args.token
+    StubGraphQLHandler.asset_url = args.asset_url.rstrip("/")
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubGraphQLHandler)
+    # With --port 0 the OS picks a free port, so print the one that was used
+    port = server.server_address[1]
+    print(f"Serving GraphQL on http://127.0.0.1:{port}/graphql", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
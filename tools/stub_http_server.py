@@ -0,0 +1,141 @@
+"""
+CircuitPython Bundle Manager v2 - a Python program to easily manage
+modules on a CircuitPython device!
+
+Copyright (C) 2021 UnsignedArduino
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A stand-in for GitHub's release asset server, for testing downloads
+# without a network. Serves the files in a directory with ETags and Range /
+# If-Range support, and can cut responses short to simulate a dropped
+# connection. Run from the repository root:
+#
+#   python -m tools.stub_http_server --directory path/to/assets \
+#       --port 8765 --cut-after 100000 --cut-times 2
+#
+# Each file is then available at http://127.0.0.1:8765/<name>, and the first
+# 2 responses for each file stop after 100000 bytes.
+
+import hashlib
+from argparse import ArgumentParser
+from collections import defaultdict
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock
+from typing import Union
+
+
+class StubRequestHandler(SimpleHTTPRequestHandler):
+    cut_after: Union[int, None] = None
+    cut_times = 0
+    cuts = defaultdict(int)
+    cuts_lock = Lock()
+
+    def etag(self, path: Path) -> str:
+        """
+        Make an ETag for a file from its contents.
+
+        :param path: The path to the file.
+        :return: A quoted string.
+        """
+        return f"\"{hashlib.sha1(path.read_bytes()).hexdigest()}\""
+
+    def should_cut(self, path: Path) -> bool:
+        """
+        Get whether this response should be cut short, and count it if so.
+
+        :param path: The path to the file being sent.
+        :return: A bool.
+        """
+        if self.cut_after is None:
+            return False
+        with self.cuts_lock:
+            if self.cuts[path] >= self.cut_times:
+                return False
+            self.cuts[path] += 1
+            return True
+
+    def do_GET(self):
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+        data = path.read_bytes()
+        etag = self.etag(path)
+        start = 0
+        status = 200
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header is not None and range_header.startswith("bytes=") \
+                and (if_range is None or if_range == etag):
+            start = int(range_header[len("bytes="):].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+        body = data[start:]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range",
+                             f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        if self.should_cut(path):
+            self.log_message(f"Cutting {self.path} after {self.cut_after} "
+                             f"bytes")
+            self.wfile.write(body[:self.cut_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+def main():
+    parser = ArgumentParser(description="Serve files like a release asset "
+                                        "server.")
+    parser.add_argument("--directory", type=Path, default=Path.cwd())
+    parser.add_argument("--port", type=int, default=8765,
+                        help="The port to serve on, or 0 for any free port.")
+    parser.add_argument("--cut-after", type=int, default=None,
+                        help="Cut responses short after this many bytes.")
+    parser.add_argument("--cut-times", type=int, default=1,
+                        help="How many responses for each file to cut short.")
+    args = parser.parse_args()
+
+    StubRequestHandler.cut_after = args.cut_after
+    StubRequestHandler.cut_times = args.cut_times
+    handler = partial(StubRequestHandler, directory=str(args.directory))
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    # With --port 0 the OS picks a free port, so print the one that was used
+    port = server.server_address[1]
+    print(f"Serving {args.directory} on http://127.0.0.1:{port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
+from queue import Empty, SimpleQueue
 from typing import Callable
 import tkinter as tk
 from threading import Thread
@@ -41,6 +42,9 @@ from ui.dialogs.loading import show_deleting
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
+# How often to look for bundle changes from the watcher, in milliseconds
+CHANGES_POLL_INTERVAL = 250
+
 
 class BundleTab(Tab):
     """
@@ -56,6 +60,7 @@ class BundleTab(Tab):
         """
         super().__init__(parent, "Bundle")
         self.cpybm = cpybm
+        self.bundle_changes = SimpleQueue()
         logger.debug("Making bundle tab")
         self.make_gui()
 
@@ -76,8 +81,67 @@ class BundleTab(Tab):
                                            padx=1, pady=1, sticky=tk.NW)
         self.update_buttons()
         self.update_selected_bundle()
-        self.update_bundle_listbox(self.load_last_selected_bundle)
+        self.update_bundle_listbox(self.on_first_update)
         make_resizable(self, 3, 0)
+        self.after(CHANGES_POLL_INTERVAL, self.poll_bundle_changes)
+
+    def on_first_update(self):
+        """
+        Select the last selected bundle and start watching the bundles
+        directory for changes once the bundles have been indexed.
+        """
+        self.load_last_selected_bundle()
+        self.cpybm.watch_manager.on_change = self.on_bundles_changed
+        self.cpybm.watch_manager.start()
+
+    def on_bundles_changed(self, added: list, removed: list, updated: list):
+        """
+        Note that bundles were added, changed or removed on the disk. Called
+        on the watcher's thread, so nothing in Tk is touched here.
+
+        :param added: The Bundles that were added.
+        :param removed: The paths of the bundles that were removed.
+        :param updated: The Bundles that were changed.
+        """
+        logger.debug(f"Bundles changed on disk: {len(added)} added, "
+                     f"{len(removed)} removed, {len(updated)} changed")
+        self.bundle_changes.put(None)
+
+    def poll_bundle_changes(self):
+        """
+        Apply queued bundle changes. Runs on the Tk main loop.
+        """
+        changed = False
+        while True:
+            try:
+                self.bundle_changes.get_nowait()
+            except Empty:
+                break
+            changed = True
+        if changed:
+            self.apply_bundle_changes()
+        self.after(CHANGES_POLL_INTERVAL, self.poll_bundle_changes)
+
+    def apply_bundle_changes(self):
+        """
+        Update the list of bundles after bundles changed on the disk, without
+        indexing everything again. Must be called on the Tk main loop.
+        """
+        selected = self.cpybm.selected_bundle
+        self.bundles = list(self.cpybm.bundle_manager.bundles)
+        self.listbox.values = [b.title for b in self.bundles]
+        self.listbox.selected = ()
+        if selected is not None:
+            for index, bundle in enumerate(self.bundles):
+                if bundle.path == selected.path:
+                    self.listbox.selected = (index, )
+                    if bundle is not selected:
+                        self.cpybm.selected_bundle = bundle
+                    break
+            else:
+                self.cpybm.selected_bundle = None
+                self.selected_label.text = "Selected bundle: None"
+        self.update_buttons()
 
     def make_buttons(self):
         """
@@ -106,6 +170,9 @@ class BundleTab(Tab):
         self.refresh_button = Button(self.buttons_frame, text="Refresh",
                                      command=self.update_bundle_listbox)
         self.refresh_button.grid(row=7, column=0, padx=1, pady=1, sticky=tk.NSEW)
+        self.rebuild_button = Button(self.buttons_frame, text="Rebuild index",
+                                     command=self.rebuild_bundle_index)
+        self.rebuild_button.grid(row=8, column=0, padx=1, pady=1, sticky=tk.NSEW)
 
     def add_bundle(self):
         """
@@ -131,7 +198,6 @@ class BundleTab(Tab):
         """
         Pop the currently selected bundle.
         """
-        name = self.listbox.values[self.listbox.selected[0]]
         bundle = self.bundles[self.listbox.selected[0]]
         if not ask_ok_or_cancel(self, title="CircuitPython Bundle Manager v2: Confirm",
                                 message="Are you sure you want to delete "
@@ -237,11 +303,21 @@ class BundleTab(Tab):
         self.listbox_scroll.grid(row=0, column=1, padx=(0, 1), pady=1)
         make_resizable(self.listbox_frame, 0, 0)
 
-    def update_bundle_listbox(self, on_finish: Callable = lambda: None):
+    def rebuild_bundle_index(self):
+        """
+        Throw away the bundle index cache and update the list of bundles.
+        """
+        logger.debug("Rebuilding bundle index")
+        self.update_bundle_listbox(rebuild=True)
+
+    def update_bundle_listbox(self, on_finish: Callable = lambda: None,
+                              rebuild: bool = False):
         """
         Update the list of bundles available.
 
         :param on_finish: The function to run when the thread finishes.
+        :param rebuild: Whether to scan every bundle again instead of using
+         the bundle index cache.
         """
         logger.debug("Updating list of bundles")
         self.listbox_frame.enabled = False
@@ -249,7 +325,7 @@ class BundleTab(Tab):
         self.bundles = []
 
         def update():
-            self.cpybm.bundle_manager.index_bundles()
+            self.cpybm.bundle_manager.index_bundles(rebuild=rebuild)
             self.bundles = self.cpybm.bundle_manager.bundles
             self.bundles = sorted(self.bundles, key=lambda b: b.released.timestamp(), reverse=True)
             self.listbox.values = [b.title for b in self.bundles]
@@ -21,10 +21,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import logging
 import tkinter as tk
 import webbrowser
+from queue import Empty, SimpleQueue
 from threading import Thread
 from typing import Union
 
 from TkZero.Button import Button
+from TkZero.Checkbutton import Checkbutton
 from TkZero.Dialog import CustomDialog
 from TkZero.Dialog import show_error, show_info
 from TkZero.Entry import Entry
@@ -32,17 +34,27 @@ from TkZero.Frame import Frame
 from TkZero.Label import Label
 from TkZero.Listbox import Listbox
 from TkZero.Scrollbar import Scrollbar
-from github.GithubException import BadCredentialsException
+from github.GithubException import BadCredentialsException, \
+    RateLimitExceededException
 
 from circuitpython_bundle_manager import CircuitPythonBundleManager
 from constants import *
 from helpers.create_logger import create_logger
+from helpers.github_api import Release
 from helpers.resize import make_resizable
-from managers.github_manager import GitHubManager
-from ui.dialogs.loading import show_download_release
+from managers.github_manager import EXAMPLES_NAME, GitHubManager, \
+    asset_version
+from ui.dialogs.loading import TkProgress, show_download_release
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
+# How far down the list (from 0 to 1) has to be visible before more releases
+# are loaded
+LOAD_MORE_AT = 0.9
+# How often to check whether a page of releases finished loading, in
+# milliseconds
+LOAD_POLL_INTERVAL = 50
+
 
 class AddBundleDialog(CustomDialog):
     """
@@ -76,9 +88,9 @@ class AddBundleDialog(CustomDialog):
             self.destroy()
             return
         self.token = cpybm.cred_manager.get_github_token()
-        self.values = {}
-        self.curr_page = 0
-        self.max_page = 0
+        self.shown = []
+        self.loading_more = False
+        self.load_failed = False
         make_resizable(self, cols=range(2), rows=1)
         self.create_gui()
         self.bind("<Escape>", lambda _: self.close())
@@ -90,6 +102,8 @@ class AddBundleDialog(CustomDialog):
         self.update_idletasks()
         self.after(10, lambda: self.update_first_time())
         self.wait_till_destroyed()
+        # Listings are only written to the disk every so often while browsing
+        self.cpybm.api_cache.save_to_disk()
 
     def make_sidebar(self):
         """
@@ -97,7 +111,7 @@ class AddBundleDialog(CustomDialog):
         """
         button_frame = Frame(self)
         button_frame.grid(row=1, column=1, padx=1, pady=1, sticky=tk.NW + tk.E)
-        make_resizable(button_frame, range(0, 4), 0)
+        make_resizable(button_frame, range(0, 6), 0)
 
         self.open_url_button = Button(button_frame,
                                       text="Open release on GitHub")
@@ -105,34 +119,74 @@ class AddBundleDialog(CustomDialog):
         self.open_url_button.grid(row=0, column=0, padx=1, pady=1,
                                   sticky=tk.NW + tk.E)
 
-        version_frame = Frame(button_frame)
-        version_frame.grid(row=1, column=0, padx=1, pady=1,
-                           sticky=tk.NW + tk.E)
-        make_resizable(version_frame, 0, 1)
+        self.versions_frame = Frame(button_frame)
+        self.versions_frame.grid(row=1, column=0, padx=1, pady=1,
+                                 sticky=tk.NW + tk.E)
+        make_resizable(self.versions_frame, 0, 0)
+        self.version_checks = {}
 
-        self.versions_label = Label(version_frame, text="Versions available: ")
+        self.versions_label = Label(self.versions_frame,
+                                    text="Versions to download: ")
         self.versions_label.grid(row=0, column=0, padx=1, pady=1, sticky=tk.NW)
 
-        self.versions_entry = Entry(version_frame, width=25)
-        self.versions_entry.read_only = True
-        self.versions_entry.grid(row=0, column=1, padx=1, pady=1,
-                                 sticky=tk.NW + tk.E)
+        self.examples_check = Checkbutton(
+            button_frame, text="Include examples",
+            command=lambda: self.cpybm.data_manager.set_key(
+                "download_examples", self.examples_check.value
+            )
+        )
+        if self.cpybm.data_manager.has_key("download_examples"):
+            self.examples_check.value = \
+                self.cpybm.data_manager.get_key("download_examples")
+        else:
+            self.examples_check.value = False
+        self.examples_check.grid(row=2, column=0, padx=1, pady=1,
+                                 sticky=tk.NW)
+
+        self.upgrade_check = Checkbutton(
+            button_frame, text="Reuse unchanged modules from\n"
+                               "the newest older bundle",
+            command=lambda: self.cpybm.data_manager.set_key(
+                "upgrade_from_previous", self.upgrade_check.value
+            )
+        )
+        if self.cpybm.data_manager.has_key("upgrade_from_previous"):
+            self.upgrade_check.value = \
+                self.cpybm.data_manager.get_key("upgrade_from_previous")
+        else:
+            self.upgrade_check.value = True
+        self.upgrade_check.grid(row=3, column=0, padx=1, pady=1,
+                                sticky=tk.NW)
 
         def download():
+            if not any(check.value for check in
+                       self.version_checks.values()):
+                show_error(self,
+                           title="CircuitPython Bundle Manager v2: Error!",
+                           message="Please select at least one version to "
+                                   "download!")
+                return
             download_dlg, pb, lbl = show_download_release(self)
-
-            def update_pb(got, total, status):
-                pb.value = got
-                pb.maximum = total
-                lbl.text = status
+            progress = TkProgress(download_dlg, pb, lbl)
+            reporter = progress.reporter()
+
+            versions = [version for version, check in
+                        self.version_checks.items() if check.value]
+            include_examples = self.examples_check.value
+            selected_release = self.selected_release()
+            previous = None
+            if self.upgrade_check.value:
+                previous = self.cpybm.bundle_manager.previous_bundle(
+                    selected_release.published_at.timestamp(),
+                    self.use_community
+                )
+                logger.debug(f"Upgrading from {previous}")
 
             def actually_download():
-                selected_index = self.listbox.selected[0]
-                selected = self.values[
-                    list(self.values.keys())[selected_index]].title
-                selected_release = self.values[selected]
                 try:
-                    self.gm.download_release(selected_release, update_pb)
+                    self.gm.download_release(selected_release, reporter,
+                                             versions, include_examples,
+                                             previous)
                 except Exception as e:
                     logger.exception("Error while downloading release!")
                     show_error(self,
@@ -144,6 +198,7 @@ class AddBundleDialog(CustomDialog):
                               title="CircuitPython Bundle Manager v2: Info",
                               message="Successfully downloaded release!")
                 finally:
+                    progress.stop()
                     download_dlg.destroy()
                     self.grab_set()
 
@@ -154,14 +209,49 @@ class AddBundleDialog(CustomDialog):
         self.download_button = Button(button_frame, text="Download",
                                       command=download)
         self.download_button.enabled = False
-        self.download_button.grid(row=2, column=0, padx=1, pady=1,
+        self.download_button.grid(row=4, column=0, padx=1, pady=1,
                                   sticky=tk.NW + tk.E)
 
         self.cancel_button = Button(button_frame, text="Close",
                                     command=self.close)
-        self.cancel_button.grid(row=3, column=0, padx=1, pady=1,
+        self.cancel_button.grid(row=5, column=0, padx=1, pady=1,
                                 sticky=tk.NW + tk.E)
 
+    def save_version_checks(self):
+        """
+        Remember which versions were unchecked, so they stay unchecked for
+        other releases and the next time the dialog is opened.
+        """
+        unwanted = set()
+        if self.cpybm.data_manager.has_key("unwanted_versions"):
+            unwanted = set(self.cpybm.data_manager.get_key("unwanted_versions"))
+        for version, check in self.version_checks.items():
+            if check.value:
+                unwanted.discard(version)
+            else:
+                unwanted.add(version)
+        self.cpybm.data_manager.set_key("unwanted_versions", sorted(unwanted))
+
+    def update_version_checks(self, versions: list[str]):
+        """
+        Show a check button for every version of the selected release.
+
+        :param versions: A list of versions, like ["py", "7.x-mpy"].
+        """
+        for check in self.version_checks.values():
+            check.destroy()
+        self.version_checks = {}
+        unwanted = []
+        if self.cpybm.data_manager.has_key("unwanted_versions"):
+            unwanted = self.cpybm.data_manager.get_key("unwanted_versions")
+        for index, version in enumerate(versions):
+            check = Checkbutton(self.versions_frame, text=version,
+                                command=self.save_version_checks)
+            check.value = version not in unwanted
+            check.grid(row=index + 1, column=0, padx=(12, 1), pady=0,
+                       sticky=tk.NW)
+            self.version_checks[version] = check
+
     def update_sidebar(self):
         """
         Update the side bar in the dialog. (With all the buttons)
@@ -169,53 +259,43 @@ class AddBundleDialog(CustomDialog):
         logger.debug("Update sidebar")
         self.open_url_button.enabled = False
         self.versions_label.enabled = False
-        self.versions_entry.enabled = True
-        self.versions_entry.read_only = False
-        self.versions_entry.value = ""
-        self.versions_entry.read_only = True
-        self.versions_entry.enabled = False
+        self.examples_check.enabled = False
+        self.update_version_checks([])
         self.download_button.enabled = False
         self.update_idletasks()
-        if len(self.listbox.selected) == 0:
+        selected_release = self.selected_release()
+        if selected_release is None:
             return
-        selected_index = self.listbox.selected[0]
-        selected = self.values[list(self.values.keys())[selected_index]].title
-        selected_release = self.values[selected]
         self.open_url_button.configure(
             command=lambda: webbrowser.open(selected_release.html_url)
         )
         assets = list(selected_release.get_assets())
-        self.versions_entry.enabled = True
-        self.versions_entry.read_only = False
         versions = []
         for asset in assets:
-            name = asset.name
-            if "-mpy-" not in name and "-py-" not in name:
+            version = asset_version(asset.name, selected_release.tag_name)
+            if version is None or version == EXAMPLES_NAME:
                 continue
-            show_name = name.replace("adafruit-circuitpython-bundle-", "")
-            show_name = show_name.replace("circuitpython-community-bundle-", "")
-            show_name = show_name.replace(
-                f"-{selected_release.tag_name}.zip", "")
-            versions.append(show_name)
-        self.versions_entry.value = ", ".join(versions)
-        self.versions_entry.read_only = True
+            versions.append(version)
+        self.update_version_checks(versions)
         self.open_url_button.enabled = True
         self.versions_label.enabled = True
+        self.examples_check.enabled = True
         self.download_button.enabled = True
 
-    def change_page(self, new_page: int):
+    def selected_release(self) -> Union[Release, None]:
         """
-        Set the new page.
+        Get the release selected in the listbox.
 
-        :param new_page: The new page to set.
+        :return: A Release, or None if nothing is selected.
         """
-        self.curr_page = new_page
-        self.update_navigation()
-        self.update_page()
+        if len(self.listbox.selected) == 0:
+            return None
+        return self.shown[self.listbox.selected[0]]
 
     def make_listbox(self):
         """
-        Make the listbox which has all the releases in it.
+        Make the listbox which has all the releases in it. More releases are
+        loaded as it is scrolled to the bottom.
         """
         listbox_frame = Frame(self)
         listbox_frame.grid(row=1, column=0, padx=1, pady=1, sticky=tk.NSEW)
@@ -225,7 +305,11 @@ class AddBundleDialog(CustomDialog):
         listbox_label.grid(row=0, column=0, columnspan=2, padx=1, pady=1,
                            sticky=tk.NW)
 
-        self.listbox = Listbox(listbox_frame, values=list(self.values.keys()),
+        self.search_entry = Entry(listbox_frame, command=self.update_listbox)
+        self.search_entry.grid(row=0, column=0, columnspan=2, padx=1, pady=1,
+                               sticky=tk.NW + tk.E)
+
+        self.listbox = Listbox(listbox_frame, values=[],
                                height=10, width=30,
                                on_select=self.update_sidebar)
         self.listbox.grid(row=1, column=0, padx=(1, 0), pady=1, sticky=tk.NSEW)
@@ -233,76 +317,140 @@ class AddBundleDialog(CustomDialog):
         listbox_scroll = Scrollbar(listbox_frame, widget=self.listbox)
         listbox_scroll.grid(row=1, column=1, padx=(0, 1), pady=1)
 
-        navigate_frame = Frame(listbox_frame)
-        navigate_frame.grid(row=2, column=0, padx=1, pady=1, sticky=tk.NSEW)
-        make_resizable(navigate_frame, rows=0, cols=range(6))
-
-        self.leftest_button = Button(navigate_frame, text="<<",
-                                     command=lambda: self.change_page(0))
-        self.leftest_button.configure(width=3)
-        self.leftest_button.grid(row=0, column=0, padx=1, pady=1,
-                                 sticky=tk.NW + tk.E)
+        def on_scroll(first: str, last: str):
+            listbox_scroll.set(first, last)
+            if float(last) >= LOAD_MORE_AT:
+                self.after_idle(self.load_more)
 
-        self.left_button = Button(navigate_frame, text="<",
-                                  command=lambda: self.change_page(
-                                      self.curr_page - 1))
-        self.left_button.configure(width=3)
-        self.left_button.grid(row=0, column=1, padx=1, pady=1,
-                              sticky=tk.NW + tk.E)
-
-        self.page_lbl = Label(navigate_frame,
-                              text=f"{self.curr_page + 1}/{self.max_page} pages")
-        self.page_lbl.grid(row=0, column=3, padx=1, pady=(3, 1),
-                           sticky=tk.NW + tk.E)
-
-        self.right_button = Button(navigate_frame, text=">",
-                                   command=lambda: self.change_page(
-                                       self.curr_page + 1))
-        self.right_button.configure(width=3)
-        self.right_button.grid(row=0, column=4, padx=1, pady=1,
-                               sticky=tk.NW + tk.E)
+        self.listbox.configure(yscrollcommand=on_scroll)
 
-        self.rightest_button = Button(navigate_frame, text=">>",
-                                      command=lambda: self.change_page(
-                                          self.max_page - 1))
-        self.rightest_button.configure(width=3)
-        self.rightest_button.grid(row=0, column=5, padx=1, pady=1,
-                                  sticky=tk.NW + tk.E)
+        self.status_lbl = Label(listbox_frame, text="Loading releases...")
+        self.status_lbl.grid(row=2, column=0, columnspan=2, padx=1, pady=1,
+                             sticky=tk.NW)
 
-    def update_navigation(self):
+    def update_listbox(self):
         """
-        Update the navigation
+        Show the loaded releases that match the search in the listbox,
+        keeping the selection.
         """
-        logger.debug("Updating navigation")
-        if self.curr_page == 0:
-            self.left_button.enabled = False
-            self.leftest_button.enabled = False
+        releases, next_page = self.gm.release_pag.loaded()
+        search = self.search_entry.value.strip().lower()
+        if search != "":
+            shown = [r for r in releases if search in r.title.lower() or
+                     search in r.tag_name.lower()]
         else:
-            self.left_button.enabled = True
-            self.leftest_button.enabled = True
-        if self.curr_page == self.max_page - 1:
-            self.right_button.enabled = False
-            self.rightest_button.enabled = False
+            shown = releases
+        selected = self.selected_release()
+        self.shown = shown
+        self.listbox.values = [r.title for r in shown]
+        if selected in shown:
+            self.listbox.selected = (shown.index(selected), )
+        status = f"{len(releases)} releases loaded"
+        if search != "":
+            status = f"{len(shown)} matches in {status}"
+        if self.loading_more:
+            status += ", loading more..."
+        elif not self.gm.release_pag.exists(next_page):
+            status += ", that's all of them"
+        elif search == "":
+            status += ", scroll down for more"
+        remaining, limit, _ = self.gm.api.scheduler.quota()
+        if remaining is not None:
+            status += f"\n{remaining} / {limit} GitHub API requests left"
+        self.status_lbl.text = status
+        self.update_sidebar()
+
+    def load_more(self):
+        """
+        Load the next page of releases in a background thread, unless one is
+        already loading, every page is loaded or the list is being searched.
+        Only the request runs on the thread, the GUI is updated from the Tk
+        main loop once it finishes.
+        """
+        pages = self.gm.release_pag
+        _, page = pages.loaded()
+        if self.loading_more or self.load_failed or \
+                not pages.exists(page) or \
+                (page > 0 and self.search_entry.value.strip() != ""):
+            return
+        logger.debug(f"Loading page {page}")
+        self.loading_more = True
+        results = SimpleQueue()
+
+        def fetch():
+            try:
+                pages.get_page(page)
+            except Exception as e:
+                results.put(e)
+            else:
+                results.put(None)
+
+        if pages.is_loaded(page):
+            fetch()
+            self.finish_loading(page, results.get())
         else:
-            self.right_button.enabled = True
-            self.rightest_button.enabled = True
-        self.page_lbl.text = f"{self.curr_page + 1}/{self.max_page} pages"
+            self.update_listbox()
+            t = Thread(target=fetch, daemon=True)
+            logger.debug(f"Starting thread {t}")
+            t.start()
+            self.after(LOAD_POLL_INTERVAL,
+                       lambda: self.poll_loading(page, results))
 
-    def update_page(self):
+    def poll_loading(self, page: int, results: SimpleQueue):
         """
-        Update the current page
+        Check whether a page of releases finished loading. Runs on the Tk main
+        loop.
+
+        :param page: The page number being loaded.
+        :param results: The queue the loading thread puts None or the error
+         it ran into in.
         """
-        logger.debug("Updating current page")
-        self.enabled = False
-        self.update_idletasks()
-        self.values = {}
-        logger.debug(f"Updating to page {self.curr_page}")
-        for release in self.gm.release_pag.get_page(self.curr_page):
-            self.values[release.title] = release
-        self.listbox.values = self.values.keys()
+        if not self.winfo_exists():
+            return
+        try:
+            error = results.get_nowait()
+        except Empty:
+            self.after(LOAD_POLL_INTERVAL,
+                       lambda: self.poll_loading(page, results))
+            return
+        self.finish_loading(page, error)
+
+    def finish_loading(self, page: int, error: Union[Exception, None]):
+        """
+        Show a page of releases that finished loading, or the error that
+        happened while loading it. Runs on the Tk main loop.
+
+        :param page: The page number that was loaded.
+        :param error: The error that was raised while loading it, or None.
+        """
+        self.loading_more = False
+        if isinstance(error, BadCredentialsException):
+            logger.error("Bad token!", exc_info=error)
+            show_error(self, title="CircuitPython Bundle Manager v2: Error!",
+                       message="Bad token! Please go to Other --> Go to "
+                               "credential settings --> Open credential "
+                               "manager and fill and save a valid GitHub "
+                               "token!",
+                       detail=str(error))
+            self.destroy()
+            return
+        elif isinstance(error, RateLimitExceededException):
+            logger.error("Rate limit exceeded!", exc_info=error)
+            self.load_failed = True
+            show_error(self, title="CircuitPython Bundle Manager v2: Error!",
+                       message=f"GitHub's API rate limit has been used "
+                               f"up! Please try again after "
+                               f"{self.gm.api.scheduler.reset_text()}.",
+                       detail=str(error))
+        elif error is not None:
+            logger.error(f"Error while loading page {page}!", exc_info=error)
+            self.load_failed = True
+            show_error(self, title="CircuitPython Bundle Manager v2: Error!",
+                       message="There was an error loading the releases!",
+                       detail=str(error))
         self.enabled = True
-        self.update_sidebar()
-        self.update_navigation()
+        self.update_listbox()
+        self.gm.release_pag.prefetch((page + 1, ))
 
     def create_gui(self):
         """
@@ -317,17 +465,13 @@ class AddBundleDialog(CustomDialog):
         """
         self.update_idletasks()
         try:
-            self.gm = GitHubManager(self.token, self.repo, BUNDLES_PATH, self.use_community)
-        except BadCredentialsException as e:
-            logger.exception("Bad token!")
-            show_error(self, title="CircuitPython Bundle Manager v2: Error!",
-                       message="Bad token! Please go to Other --> Go to "
-                               "credential settings --> Open credential "
-                               "manager and fill and save a valid GitHub "
-                               "token!",
-                       detail=str(e))
-            self.destroy()
-            return
+            self.gm = GitHubManager(self.token, self.repo, BUNDLES_PATH,
+                                    self.use_community,
+                                    self.cpybm.catalog_manager,
+                                    DOWNLOAD_WORKERS, DOWNLOAD_RETRIES,
+                                    self.cpybm.asset_cache_manager,
+                                    self.cpybm.api_cache, EXTRACT_WORKERS,
+                                    self.cpybm.api_scheduler, USE_GRAPHQL)
         except Exception as e:
             logger.exception("Error while authenticating with GitHub!")
             show_error(self, title="CircuitPython Bundle Manager v2: Error!",
@@ -335,11 +479,7 @@ class AddBundleDialog(CustomDialog):
                        detail=str(e))
             self.destroy()
             return
-        self.max_page = self.gm.max_page
-        self.update_page()
-        self.enabled = True
-        self.update_sidebar()
-        self.update_navigation()
+        self.load_more()
         self.update_idletasks()
 
 
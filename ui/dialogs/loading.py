@@ -20,14 +20,16 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
 import tkinter as tk
+from queue import Empty, SimpleQueue
 
 from TkZero.Dialog import CustomDialog
 from TkZero.Label import Label
 from TkZero.Progressbar import Progressbar, ProgressModes
 
 from helpers.create_logger import create_logger
+from helpers.progress import ProgressReporter
 from helpers.resize import make_resizable
-from typing import Callable
+from typing import Callable, Union
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
@@ -143,15 +145,16 @@ def show_deleting(parent, name: str) -> CustomDialog:
                               f"Removing bundle {name}...")
 
 
-def show_installing(parent, name: str) -> CustomDialog:
+def show_installing(parent, name: str) -> \
+        tuple[CustomDialog, Progressbar, Label]:
     """
     Show loading dialog saying that we are installing a module.
 
     :param parent: The parent of this window.
     :param name: The name of the installing module.
     """
-    return show_indeterminate(parent, f"Installing module {name}",
-                              f"Installing module {name}...")
+    return show_determinate_with_label(parent, f"Installing module {name}",
+                                       f"Installing module {name}...")
 
 
 def show_uninstalling(parent, name: str) -> CustomDialog:
@@ -165,15 +168,16 @@ def show_uninstalling(parent, name: str) -> CustomDialog:
                               f"Uninstalling module {name}...")
 
 
-def show_reinstalling(parent, name: str) -> CustomDialog:
+def show_reinstalling(parent, name: str) -> \
+        tuple[CustomDialog, Progressbar, Label]:
     """
     Show loading dialog saying that we are reinstalling a module.
 
     :param parent: The parent of this window.
     :param name: The name of the reinstalling module.
     """
-    return show_indeterminate(parent, f"Reinstalling module {name}",
-                              f"Reinstalling module {name}...")
+    return show_determinate_with_label(parent, f"Reinstalling module {name}",
+                                       f"Reinstalling module {name}...")
 
 
 def show_download_release(parent) -> tuple[CustomDialog, Progressbar, Label]:
@@ -184,3 +188,73 @@ def show_download_release(parent) -> tuple[CustomDialog, Progressbar, Label]:
     """
     return show_determinate_with_label(parent, f"Downloading release",
                                        f"Downloading release...")
+
+
+class TkProgress:
+    def __init__(self, widget: tk.Misc, pb: Progressbar,
+                 label: Union[Label, None] = None, poll_interval: int = 50):
+        """
+        Make a TkProgress, which shows progress from any thread in a progress
+        bar and label. Updates are put in a queue that the Tk main loop drains
+        with after(), so widgets are only touched from the main thread.
+
+        :param widget: The widget whose after() to use, usually the dialog.
+        :param pb: The progress bar.
+        :param label: The label to show the status in, or None.
+        :param poll_interval: How often to look at the queue in milliseconds.
+        """
+        self.widget = widget
+        self.pb = pb
+        self.label = label
+        self.poll_interval = poll_interval
+        self.queue = SimpleQueue()
+        self.running = True
+        self.widget.after(self.poll_interval, self.poll)
+
+    def put(self, got: int, total: int, status: str):
+        """
+        Queue an update. Safe to call from any thread.
+
+        :param got: How far.
+        :param total: The total.
+        :param status: The status.
+        """
+        self.queue.put((got, total, status))
+
+    def poll(self):
+        """
+        Show the newest queued update. Runs on the Tk main loop.
+        """
+        latest = None
+        while True:
+            try:
+                latest = self.queue.get_nowait()
+            except Empty:
+                break
+        try:
+            if latest is not None:
+                got, total, status = latest
+                self.pb.maximum = max(total, 1)
+                self.pb.value = got
+                if self.label is not None:
+                    self.label.text = status
+            if self.running:
+                self.widget.after(self.poll_interval, self.poll)
+        except tk.TclError:
+            logger.debug("Progress widgets are gone, stopping")
+            self.running = False
+
+    def stop(self):
+        """
+        Stop showing updates.
+        """
+        self.running = False
+
+    def reporter(self, interval: float = 0.1) -> ProgressReporter:
+        """
+        Make a ProgressReporter that reports to this.
+
+        :param interval: The least time between updates in seconds.
+        :return: A ProgressReporter.
+        """
+        return ProgressReporter(self.put, interval)
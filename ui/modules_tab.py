@@ -123,14 +123,9 @@ class ModulesTab(Tab):
         logger.debug(f"Selected version is {version}")
         self.cpybm.data_manager.set_key("last_selected_version", version)
         search = self.search_entry.value
-        bundle = self.string_to_bundle[version]
-        self.string_to_module = {}
-        modules = []
-        for name, module in sorted(bundle.items()):
-            self.string_to_module[name] = module
-            if search == "" or search in name:
-                modules.append(name)
-        self.bundle_modules_listbox.values = modules
+        self.string_to_module = self.string_to_bundle[version]
+        index = self.cpybm.selected_bundle.search_index(version)
+        self.bundle_modules_listbox.values = index.search(search)
 
     def update_bundle_modules(self):
         """
@@ -144,9 +139,7 @@ class ModulesTab(Tab):
             self.search_entry.grid()
             self.bundle_listbox_frame.grid()
             self.bundle_version_frame.grid()
-            self.string_to_bundle = {}
-            for version, bundle in self.cpybm.selected_bundle.bundle.items():
-                self.string_to_bundle[version] = bundle
+            self.string_to_bundle = self.cpybm.selected_bundle.bundle
             self.bundle_version_combox.read_only = False
             self.bundle_version_combox.values = self.string_to_bundle.keys()
             if self.cpybm.data_manager.has_key("last_selected_version") and \
@@ -267,7 +260,9 @@ class ModulesTab(Tab):
         target = self.string_to_module[target_name]
         logger.debug(f"Installing module {target} ({target_name})")
         self.enable_everything(False)
-        dialog = loading.show_installing(self, target_name)
+        dialog, pb, label = loading.show_installing(self, target_name)
+        progress = loading.TkProgress(dialog, pb, label)
+        reporter = progress.reporter()
 
         def install():
             try:
@@ -276,7 +271,7 @@ class ModulesTab(Tab):
                                             f"the CircuitPython device and "
                                             f"then refresh the available "
                                             f"drives!")
-                self.cpybm.selected_drive.install_module(target)
+                self.cpybm.selected_drive.install_module(target, reporter)
             except Exception as e:
                 show_error(self, title="CircuitPython Bundle Manager: Error!",
                            message=f"Failed to install module {target_name}!",
@@ -285,6 +280,7 @@ class ModulesTab(Tab):
                 show_info(self, title="CircuitPython Bundle Manager: Info",
                           message=f"Successfully installed module {target_name}!")
             finally:
+                progress.stop()
                 dialog.destroy()
                 self.enable_everything()
             self.cpybm.selected_drive.recalculate_info()
@@ -301,14 +297,16 @@ class ModulesTab(Tab):
         target_name = self.device_modules_listbox.values[self.device_modules_listbox.selected[0]]
         logger.debug(f"Reinstalling module {target_name}")
         self.enable_everything(False)
-        dialog = loading.show_reinstalling(self, target_name)
+        dialog, pb, label = loading.show_reinstalling(self, target_name)
+        progress = loading.TkProgress(dialog, pb, label)
+        reporter = progress.reporter()
 
         def update():
             try:
                 self.cpybm.selected_drive.uninstall_module(target_name)
                 target = self.string_to_module[target_name]
                 logger.debug(f"Installing module {target} ({target_name})")
-                self.cpybm.selected_drive.install_module(target)
+                self.cpybm.selected_drive.install_module(target, reporter)
             except Exception as e:
                 show_error(self, title="CircuitPython Bundle Manager: Error!",
                            message=f"Failed to reinstall module {target_name}!",
@@ -317,6 +315,7 @@ class ModulesTab(Tab):
                 show_info(self, title="CircuitPython Bundle Manager: Info",
                           message=f"Successfully reinstalled module {target_name}!")
             finally:
+                progress.stop()
                 dialog.destroy()
                 self.enable_everything()
             self.cpybm.selected_drive.recalculate_info()
@@ -35,6 +35,7 @@ from circuitpython_bundle_manager import CircuitPythonBundleManager
 from managers.credential_manager import HAS_SYS_KEYRING
 from constants import *
 from helpers.create_logger import create_logger
+from helpers.file_size import ByteSize
 from helpers.resize import make_resizable
 from ui.dialogs.credential_dialog import show_credential_manager
 from ui.dialogs.text_dialog import show_text_file
@@ -189,6 +190,33 @@ class OtherTab(Tab):
             other_command=lambda: self.copy_to_clipboard(str(self.settings_path))
         )
         open_json_button.grid(row=5, column=0, padx=1, pady=1, sticky=tk.SW + tk.E)
+        self.make_cache_frame()
+
+    def make_cache_frame(self):
+        """
+        Make the frame that shows how much the downloaded asset cache is
+        using, with buttons to trim or clear it.
+        """
+        cache = self.cpybm.asset_cache_manager
+        cache_frame = Labelframe(self.main_frame, text="Downloaded asset cache")
+        cache_frame.grid(row=6, column=0, padx=1, pady=1, sticky=tk.NSEW)
+        make_resizable(cache_frame, 0, range(2))
+        cache_lbl = Label(cache_frame, text="Using ?")
+        cache_lbl.grid(row=0, column=0, columnspan=2, padx=1, pady=1, sticky=tk.NW)
+
+        def update_cache_lbl():
+            cache_lbl.text = f"Using {ByteSize(cache.size)} of " \
+                             f"{ByteSize(cache.max_size)} for " \
+                             f"{len(cache.entries)} assets"
+
+        trim_button = Button(cache_frame, text="Trim to limit",
+                             command=lambda: (cache.trim(), update_cache_lbl()))
+        trim_button.grid(row=1, column=0, padx=1, pady=1, sticky=tk.NW + tk.E)
+        clear_button = Button(cache_frame, text="Clear cache",
+                              command=lambda: (cache.clear(), update_cache_lbl()))
+        clear_button.grid(row=1, column=1, padx=1, pady=1, sticky=tk.NW + tk.E)
+        cache_frame.bind("<Map>", lambda _: update_cache_lbl())
+        update_cache_lbl()
 
     def show_main_frame(self):
         """